@@ -0,0 +1,255 @@
+# =========================
+# Auditoría de predicciones
+# =========================
+# Cada predicción que devuelve la API queda registrada (entrada, modelo y
+# versión, resultado). La petición solo agrega una referencia a lo que ya
+# tiene en memoria (los pacientes validados y los arreglos del resultado) a
+# una cola: armar los documentos y escribirlos lo hace una tarea de fondo,
+# en lotes (insert_many) cada `intervalo_ms` o apenas hay `lote_max` filas.
+#
+# Destinos: MongoDB (motor, con su pool de conexiones) si hay MONGO_URL; si
+# no, un SQLite local con el mismo contenido (sirve para desarrollo y para
+# probar sin base de datos).
+#
+# Cada documento lleva un _id fijo (id de la petición + fila): si un
+# insert_many falla a medias y el lote se reintenta, lo que ya estaba escrito
+# choca por clave duplicada y se ignora en vez de quedar dos veces.
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from clinica import NIVELES
+
+logger = logging.getLogger(__name__)
+
+
+def documentos(entrada) -> list:
+    """Una entrada de la cola (una petición) -> un documento por paciente."""
+    id_peticion, ts, ruta, version, pacientes, tiene, probs, codigos = entrada
+    fecha = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return [
+        {
+            "_id": f"{id_peticion}-{i}",
+            "fecha": fecha,
+            "ruta": ruta,
+            "modelo": version,
+            "valores_ingresados": d.model_dump(),
+            "tiene_anemia": bool(t),
+            "nivel_severidad": NIVELES[int(c)],
+            "prob_anemia": float(p),
+        }
+        for i, (d, t, p, c) in enumerate(zip(pacientes, tiene, probs, codigos))
+    ]
+
+
+class DestinoMongo:
+    """insert_many sobre una colección; motor mantiene el pool de conexiones."""
+
+    def __init__(self, url: str, base: str, coleccion: str, max_conexiones: int = 4):
+        self.url = url
+        self.base = base
+        self.nombre_coleccion = coleccion
+        self.max_conexiones = max_conexiones
+        self._cliente = None
+        self._coleccion = None
+
+    def __str__(self):
+        return f"mongo:{self.base}.{self.nombre_coleccion}"
+
+    async def abrir(self):
+        # Importado acá: sin MONGO_URL no hace falta tener motor instalado
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self._cliente = AsyncIOMotorClient(self.url, maxPoolSize=self.max_conexiones)
+        self._coleccion = self._cliente[self.base][self.nombre_coleccion]
+
+    async def insertar(self, docs: list):
+        from pymongo.errors import BulkWriteError
+
+        # ordered=False: un documento con error no frena al resto del lote
+        try:
+            await self._coleccion.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Clave duplicada (11000) = ya escrito en un intento anterior
+            otros = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            if otros or e.details.get("writeConcernErrors"):
+                raise
+
+    async def cerrar(self):
+        if self._cliente is not None:
+            self._cliente.close()
+            self._cliente = None
+
+
+class DestinoSQLite:
+    """Mismo contenido en un archivo SQLite. Todas las operaciones corren en
+    un único hilo propio (la conexión no se comparte entre hilos). Cada lote
+    es una transacción: entra entero o nada, así que no guarda el _id."""
+
+    COLUMNAS = ("fecha", "ruta", "modelo", "genero", "hemoglobina", "mch", "mchc", "mcv",
+                "tiene_anemia", "nivel_severidad", "prob_anemia")
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self._hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auditoria-sqlite")
+        self._conexion = None
+
+    def __str__(self):
+        return f"sqlite:{self.ruta}"
+
+    async def _en_hilo(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._hilo, fn, *args)
+
+    def _abrir(self):
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS predicciones ("
+            "fecha TEXT, ruta TEXT, modelo TEXT, genero TEXT, hemoglobina REAL, mch REAL, "
+            "mchc REAL, mcv REAL, tiene_anemia INTEGER, nivel_severidad TEXT, prob_anemia REAL)"
+        )
+        self._conexion.commit()
+
+    def _insertar(self, docs: list):
+        filas = []
+        for d in docs:
+            v = d["valores_ingresados"]
+            filas.append((d["fecha"].isoformat(), d["ruta"], d["modelo"],
+                          v["genero"], v["hemoglobina"], v["mch"], v["mchc"], v["mcv"],
+                          int(d["tiene_anemia"]), d["nivel_severidad"], d["prob_anemia"]))
+        with self._conexion:
+            self._conexion.executemany(
+                f"INSERT INTO predicciones ({', '.join(self.COLUMNAS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNAS))})", filas)
+
+    def _cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    async def abrir(self):
+        await self._en_hilo(self._abrir)
+
+    async def insertar(self, docs: list):
+        await self._en_hilo(self._insertar, docs)
+
+    async def cerrar(self):
+        await self._en_hilo(self._cerrar)
+        self._hilo.shutdown(wait=True)
+
+
+class Auditoria:
+    """Cola en memoria + escritura por lotes en segundo plano.
+
+    `registrar` es O(1) y no copia nada: se llama desde el event loop (los
+    handlers) y nunca espera a la base de datos. Si el destino se cae, los
+    lotes vuelven a la cola y se reintentan; pasadas `max_pendientes` filas
+    se descartan las más nuevas (y se cuentan) en vez de crecer sin límite.
+    """
+
+    def __init__(self, destino, lote_max: int = 1000, intervalo_ms: float = 500.0,
+                 max_pendientes: int = 100_000):
+        if lote_max < 1 or intervalo_ms <= 0 or max_pendientes < 1:
+            raise ValueError("lote_max >= 1, intervalo_ms > 0 y max_pendientes >= 1")
+        self.destino = destino
+        self.lote_max = lote_max
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_pendientes = max_pendientes
+        self._cola = deque()
+        self._hay_lote = None
+        self._tarea = None
+        self._cerrando = False
+
+        self.pendientes = 0   # filas en cola
+        self.escritas = 0
+        self.descartadas = 0
+        self.errores = 0
+
+    # ---------- ciclo de vida ----------
+    async def iniciar(self):
+        await self.destino.abrir()
+        self._hay_lote = asyncio.Event()
+        self._tarea = asyncio.create_task(self._bucle())
+        print(f"📝 Auditoría de predicciones en {self.destino}")
+
+    async def detener(self):
+        """Corta el bucle, escribe lo que quedó en cola y cierra el destino."""
+        if self._tarea is not None:
+            # Sin cancel(): un insert a medio camino termina en vez de perderse
+            self._cerrando = True
+            self._hay_lote.set()
+            await self._tarea
+            self._tarea = None
+        while self._cola and await self.vaciar():
+            pass
+        if self._cola:
+            logger.error("Auditoría: %d predicciones sin escribir al cerrar", self.pendientes)
+        await self.destino.cerrar()
+
+    # ---------- API ----------
+    def registrar(self, ruta: str, version, pacientes, tiene, probs, codigos):
+        """Encola el resultado de una petición (secuencias alineadas)."""
+        n = len(pacientes)
+        if self.pendientes + n > self.max_pendientes:
+            self.descartadas += n
+            return
+        self._cola.append((uuid.uuid4().hex, time.time(), ruta, version or "desconocida",
+                           pacientes, tiene, probs, codigos))
+        self.pendientes += n
+        if self.pendientes >= self.lote_max and self._hay_lote is not None:
+            self._hay_lote.set()
+
+    async def vaciar(self) -> bool:
+        """Escribe UN lote (entradas completas hasta ~lote_max filas).
+        False si el destino falló (el lote vuelve a la cola)."""
+        entradas = []
+        filas = 0
+        while self._cola and (not entradas or filas + len(self._cola[0][4]) <= self.lote_max):
+            entrada = self._cola.popleft()
+            entradas.append(entrada)
+            filas += len(entrada[4])
+        if not entradas:
+            return True
+        try:
+            # Armar miles de dicts bloquearía el event loop: en un hilo
+            docs = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: [doc for e in entradas for doc in documentos(e)])
+            await self.destino.insertar(docs)
+        except Exception:
+            logger.exception("Auditoría: no se pudo escribir un lote de %d predicciones", filas)
+            self.errores += 1
+            self._cola.extendleft(reversed(entradas))
+            return False
+        self.pendientes -= filas
+        self.escritas += filas
+        return True
+
+    async def _bucle(self):
+        while not self._cerrando:
+            try:
+                await asyncio.wait_for(self._hay_lote.wait(), self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._hay_lote.clear()
+            while self._cola and not self._cerrando:
+                if not await self.vaciar():
+                    # Destino caído: reintentar en el próximo intervalo
+                    break
+                if self.pendientes < self.lote_max:
+                    # Lo que queda se junta con lo que llegue hasta el próximo tick
+                    break
+
+    def metricas(self) -> dict:
+        return {
+            "destino": str(self.destino),
+            "pendientes": self.pendientes,
+            "escritas": self.escritas,
+            "descartadas": self.descartadas,
+            "errores": self.errores,
+        }
@@ -0,0 +1,229 @@
+# === BENCHMARK DE INFERENCIA (costo de servir cada modelo) ===
+# Por cada artefacto de ml/Modelos (.pkl y .npmodel), en un proceso NUEVO
+# (para que la carga sea "en frío" y el pico de memoria sea solo suyo):
+#   - tiempo de carga
+#   - latencia p50/p99 por llamada y filas/s con lotes de 1, 8, 64, 1024 y 100k
+#   - pico de RSS (después de cargar y al final)
+# Además, prueba de carga HTTP de extremo a extremo contra
+# /api/analizar-anemia con un cliente ASGI en el mismo proceso (sin red):
+# pasa por validación, caché desactivada, micro-lotes y pool de inferencia.
+#
+# El resultado es un JSON (para comparar entre corridas / en CI):
+#   python benchmark_inferencia.py
+#   python benchmark_inferencia.py --modelos randomforest knn -o bench.json --sin-http
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from lotes import LectorCSV
+
+ROOT_DIR = Path(__file__).parent
+MODELS_DIR = ROOT_DIR.parent / "ml" / "Modelos"
+DATOS = ROOT_DIR.parent / "ml" / "data" / "anemia_clean.csv"
+SALIDA = ROOT_DIR.parent / "ml" / "resultados" / "benchmark_inferencia.json"
+
+TAMANOS_LOTE = (1, 8, 64, 1024, 100_000)
+FILAS_POR_TAMANO = 200_000  # filas a puntuar por tamaño de lote (acota el tiempo)
+MIN_REPETICIONES = 5
+MAX_REPETICIONES = 1000
+SEMILLA = 42
+
+
+def _rss_pico_mb() -> float:
+    # ru_maxrss está en KB en Linux (en bytes en macOS)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _percentiles_ms(tiempos) -> dict:
+    t = np.asarray(tiempos) * 1e3
+    return {"p50_ms": float(np.percentile(t, 50)), "p99_ms": float(np.percentile(t, 99)),
+            "media_ms": float(t.mean())}
+
+
+def filas_de_prueba(n: int) -> np.ndarray:
+    """n filas remuestreadas del dataset real (mismo orden de columnas)."""
+    with open(DATOS, encoding="utf-8-sig") as f:
+        base = np.concatenate(list(LectorCSV(f)))
+    rng = np.random.default_rng(SEMILLA)
+    return base[rng.integers(0, len(base), n)]
+
+
+def artefactos(nombres=None):
+    rutas = sorted(p for p in MODELS_DIR.glob("modelo_*") if p.suffix in (".pkl", ".npmodel"))
+    if nombres:
+        from modelos import nombre_modelo
+        rutas = [p for p in rutas if nombre_modelo(p) in nombres]
+    return rutas
+
+
+# =========================
+# Un modelo (corre en un proceso hijo)
+# =========================
+def medir_modelo(ruta: Path) -> dict:
+    t0 = time.perf_counter()
+    from modelos import cargar_modelo
+    from inferencia import predecir
+    importacion_s = time.perf_counter() - t0
+
+    cargado = cargar_modelo(ruta)
+    resultado = {
+        "modelo": cargado.nombre,
+        "artefacto": ruta.name,
+        "formato": cargado.formato,
+        "version": cargado.version,
+        "importacion_s": importacion_s,
+        "carga_s": cargado.segundos_carga,
+        "rss_pico_carga_mb": _rss_pico_mb(),
+        "lotes": {},
+    }
+    X = filas_de_prueba(max(TAMANOS_LOTE))
+    predecir(cargado.modelo, X[:1])  # calentar
+
+    for n in TAMANOS_LOTE:
+        repeticiones = int(np.clip(FILAS_POR_TAMANO // n, MIN_REPETICIONES, MAX_REPETICIONES))
+        tiempos = []
+        for i in range(repeticiones):
+            inicio = (i * n) % (len(X) - n + 1)
+            lote = X[inicio:inicio + n]
+            t = time.perf_counter()
+            predecir(cargado.modelo, lote)
+            tiempos.append(time.perf_counter() - t)
+        resultado["lotes"][str(n)] = {
+            "repeticiones": repeticiones,
+            **_percentiles_ms(tiempos),
+            "filas_por_s": n * repeticiones / sum(tiempos),
+        }
+    resultado["rss_pico_mb"] = _rss_pico_mb()
+    return resultado
+
+
+# =========================
+# Prueba HTTP de extremo a extremo (proceso hijo)
+# =========================
+async def _carga_http(peticiones: int, concurrencias, modelo):
+    import httpx
+    from server import app
+
+    X = filas_de_prueba(peticiones)
+    cuerpos = [{
+        "genero": "masculino" if fila[0] == 1 else "femenino",
+        "hemoglobina": float(fila[1]), "mch": float(fila[2]),
+        "mchc": float(fila[3]), "mcv": float(fila[4]),
+    } for fila in X]
+    url = "/api/analizar-anemia" + (f"?modelo={modelo}" if modelo else "")
+
+    resultados = {}
+    async with app.router.lifespan_context(app):
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            await cliente.post(url, json=cuerpos[0])  # calentar (y esperar la precarga)
+            for concurrencia in concurrencias:
+                tiempos, errores = [], 0
+                pendientes = iter(cuerpos)
+
+                async def trabajador():
+                    nonlocal errores
+                    for cuerpo in pendientes:
+                        t = time.perf_counter()
+                        r = await cliente.post(url, json=cuerpo)
+                        tiempos.append(time.perf_counter() - t)
+                        errores += r.status_code != 200
+
+                t0 = time.perf_counter()
+                await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+                total = time.perf_counter() - t0
+                resultados[str(concurrencia)] = {
+                    "peticiones": len(tiempos),
+                    "errores": errores,
+                    **_percentiles_ms(tiempos),
+                    "peticiones_por_s": len(tiempos) / total,
+                }
+    return {"ruta": url, "concurrencias": resultados, "rss_pico_mb": _rss_pico_mb()}
+
+
+def medir_http(peticiones: int, concurrencias, modelo) -> dict:
+    # Sin caché: se mide el camino de inferencia, no los aciertos de caché
+    os.environ["CACHE_MAX_ENTRADAS"] = "0"
+    # Ni auditoría: las peticiones sintéticas no van al registro real (el
+    # SQLite local o el Mongo de MONGO_URL del .env)
+    os.environ["AUDITORIA"] = "0"
+    return asyncio.run(_carga_http(peticiones, concurrencias, modelo))
+
+
+def _en_hijo(*args) -> dict:
+    r = subprocess.run([sys.executable, str(Path(__file__).resolve()), *args],
+                       cwd=ROOT_DIR, capture_output=True, text=True)
+    if r.returncode != 0:
+        raise RuntimeError(f"Falló el benchmark ({' '.join(args)}):\n{r.stderr}")
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide latencia, rendimiento y memoria de cada modelo.")
+    parser.add_argument("--modelos", nargs="*", help="nombres (p. ej. randomforest knn); por defecto, todos")
+    parser.add_argument("-o", "--salida", default=str(SALIDA))
+    parser.add_argument("--sin-http", action="store_true", help="omitir la prueba HTTP")
+    parser.add_argument("--peticiones", type=int, default=2000, help="peticiones HTTP por nivel de concurrencia")
+    parser.add_argument("--concurrencia", type=int, nargs="*", default=[1, 16, 64])
+    parser.add_argument("--modelo-http", default=None, help="?modelo= de la prueba HTTP (por defecto el activo)")
+    parser.add_argument("--hijo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Modo hijo: una sola medición, JSON por stdout
+    if args.hijo == "http":
+        print(json.dumps(medir_http(args.peticiones, args.concurrencia, args.modelo_http)))
+        return
+    if args.hijo:
+        print(json.dumps(medir_modelo(Path(args.hijo))))
+        return
+
+    rutas = artefactos(args.modelos)
+    if not rutas:
+        sys.exit(f"❌ No hay modelos para medir en {MODELS_DIR}")
+
+    informe = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "cpus": os.cpu_count(),
+        "tamanos_lote": list(TAMANOS_LOTE),
+        "modelos": [],
+    }
+    print("\n=== ⏱️ Benchmark de inferencia ===\n")
+    for ruta in rutas:
+        res = _en_hijo("--hijo", str(ruta))
+        informe["modelos"].append(res)
+        uno, grande = res["lotes"]["1"], res["lotes"][str(max(TAMANOS_LOTE))]
+        print(f"{res['artefacto']:50s} carga={res['carga_s'] * 1e3:8.1f} ms  "
+              f"1 fila p50={uno['p50_ms']:.3f} p99={uno['p99_ms']:.3f} ms  "
+              f"{max(TAMANOS_LOTE)} filas: {grande['filas_por_s']:,.0f} filas/s  "
+              f"RSS={res['rss_pico_mb']:.0f} MB")
+
+    if not args.sin_http:
+        http = _en_hijo("--hijo", "http", "--peticiones", str(args.peticiones),
+                        "--concurrencia", *map(str, args.concurrencia),
+                        *(["--modelo-http", args.modelo_http] if args.modelo_http else []))
+        informe["http"] = http
+        print(f"\n🌐 {http['ruta']}")
+        for c, r in http["concurrencias"].items():
+            print(f"  concurrencia {c:>3}: {r['peticiones_por_s']:8.1f} pet/s  "
+                  f"p50={r['p50_ms']:.2f} p99={r['p99_ms']:.2f} ms  errores={r['errores']}")
+
+    Path(args.salida).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Guardado {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
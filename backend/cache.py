@@ -0,0 +1,75 @@
+# =========================
+# Caché de predicciones
+# =========================
+# Los valores del hemograma llegan con 1 decimal y se repiten seguido
+# (re-tests, el formulario que se reenvía): para la misma entrada y el mismo
+# modelo la probabilidad es siempre la misma, así que no hace falta volver
+# a recorrer el bosque.
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachePredicciones:
+    """LRU con expiración (TTL) de clave -> prob_anemia.
+
+    Cada invalidación sube `generacion`; una predicción que empezó antes de
+    invalidar (con el modelo viejo) pasa la generación que leyó y ya no se
+    guarda. Con max_entradas=0 la caché queda desactivada.
+    """
+
+    def __init__(self, max_entradas: int = 10000, ttl_s: float = 300.0):
+        self.max_entradas = max_entradas
+        self.ttl = ttl_s
+        self.generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()  # clave -> (prob, expira_en)
+        self._lock = threading.Lock()
+
+    @property
+    def activa(self) -> bool:
+        return self.max_entradas > 0
+
+    def obtener(self, clave):
+        if not self.activa:
+            return None
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[1] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, clave, prob: float, generacion: int):
+        if not self.activa:
+            return
+        with self._lock:
+            if generacion != self.generacion:
+                return
+            self._datos[clave] = (prob, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, *_):
+        with self._lock:
+            self._datos.clear()
+            self.generacion += 1
+
+    def metricas(self) -> dict:
+        total = self.aciertos + self.fallos
+        return {
+            "activa": self.activa,
+            "entradas": len(self._datos),
+            "max_entradas": self.max_entradas,
+            "ttl_s": self.ttl,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / total if total else 0.0,
+            "generacion": self.generacion,
+        }
@@ -0,0 +1,63 @@
+# =========================
+# Reglas clínicas
+# =========================
+# Compartidas por la API (server.py) y la puntuación de archivos
+# (lotes.py / puntuar_archivo.py). Las versiones escalares sirven para un
+# paciente; las vectorizadas (códigos de severidad sobre arreglos) para los
+# caminos de muchas filas, con resultados idénticos.
+import numpy as np
+
+# Código de severidad = índice en esta tupla
+NIVELES = ("sin_anemia", "leve", "moderada", "severa")
+_CODIGO = {nivel: i for i, nivel in enumerate(NIVELES)}
+
+_BASE = (
+    "Mantén una dieta rica en hierro (carnes rojas, espinaca, lentejas).",
+    "Consume vitamina C para absorber hierro (naranja, kiwi).",
+    "Evita té/café junto a comidas con hierro.",
+)
+# Precalculadas una sola vez y compartidas (tuplas: nadie las modifica)
+RECOMENDACIONES = (
+    ("Niveles saludables. Mantén una buena alimentación.",),
+    _BASE + ("Control médico recomendado.",),
+    _BASE + ("Consulta con un profesional de salud cuanto antes.",),
+    _BASE + ("Acude a un centro médico urgentemente.",),
+)
+
+
+def procesar_genero(g: str) -> int:
+    return 1 if g.lower() == "masculino" else 0
+
+
+def severidad_hb(genero: str, hb: float) -> str:
+    # WHO simplified
+    if genero == "masculino":
+        if hb >= 13: return "sin_anemia"
+        if hb >= 11: return "leve"
+        if hb >= 8: return "moderada"
+        return "severa"
+    else:
+        if hb >= 12: return "sin_anemia"
+        if hb >= 11: return "leve"
+        if hb >= 8: return "moderada"
+        return "severa"
+
+
+def recomendaciones_por_severidad(s: str):
+    # Cualquier otro valor -> mensaje de niveles saludables (como antes)
+    return list(RECOMENDACIONES[_CODIGO.get(s, 0)])
+
+
+def severidad_codigos(genero_num: np.ndarray, hb: np.ndarray) -> np.ndarray:
+    """severidad_hb para arreglos: código (índice en NIVELES) por fila.
+
+    genero_num usa la codificación de procesar_genero (1 = masculino).
+    Un NaN cae en "severa", igual que en la versión escalar.
+    """
+    hb = np.asarray(hb, dtype=float)
+    limite_sano = np.where(np.asarray(genero_num) == 1, 13.0, 12.0)
+    return np.select(
+        [hb >= limite_sano, hb >= 11, hb >= 8],
+        [0, 1, 2],
+        default=3,
+    ).astype(np.int8)
@@ -0,0 +1,255 @@
+# =========================
+# Monitor de deriva (distribución de entradas y de prob_anemia)
+# =========================
+# Compara lo que llega en producción con el perfil de referencia que
+# escribe ml/entrenamiento.py (perfil_referencia.json, sobre el 90% de
+# entrenamiento): mismos bordes de histograma por variable, y para
+# prob_anemia, por modelo, las probabilidades fuera de fold de la CV.
+#
+# Memoria O(1): por variable solo se guardan los conteos por cubeta y las
+# estadísticas acumuladas (n, media y M2 de Welford, mínimo y máximo).
+# Los valores no finitos (NaN, inf) no entran en esas estadísticas (una
+# sola media NaN las arruinaría para siempre): se cuentan aparte.
+# Las peticiones solo agregan su fila a un búfer; cada `bloque` filas (o al
+# consultar) se acumula todo el búfer con operaciones vectorizadas. Todo
+# corre en el event loop, así que no hace falta ningún lock.
+import json
+from pathlib import Path
+
+import numpy as np
+
+VERSION_PERFIL = 1
+# Mismo ORDEN de columnas que la matriz del modelo
+VARIABLES = ("Gender", "Hemoglobin", "MCH", "MCHC", "MCV")
+PROB = "prob_anemia"
+N_CUBETAS = 10
+BORDES_PROB = np.linspace(0.0, 1.0, N_CUBETAS + 1)[1:-1]
+
+# PSI: < 0.1 estable, 0.1-0.25 moderada, > 0.25 significativa (regla usual)
+PSI_MODERADA = 0.1
+PSI_SIGNIFICATIVA = 0.25
+# Proporción mínima por cubeta para que el logaritmo del PSI sea finito
+EPSILON = 1e-4
+
+
+def cubetas(valores: np.ndarray, bordes: np.ndarray) -> np.ndarray:
+    """Índice de cubeta por valor: len(bordes) + 1 cubetas, con colas abiertas."""
+    return np.searchsorted(bordes, valores, side="right")
+
+
+def perfil_variable(valores, bordes=None) -> dict:
+    """Perfil de referencia de una variable. Sin `bordes`, deciles de los
+    propios valores (los empates se colapsan: Gender queda en 2 cubetas)."""
+    valores = np.asarray(valores, dtype=np.float64)
+    if bordes is None:
+        distintos = np.unique(valores)
+        if len(distintos) <= N_CUBETAS:
+            # Pocas categorías: un borde a mitad de camino entre cada par
+            bordes = (distintos[1:] + distintos[:-1]) / 2
+        else:
+            bordes = np.unique(np.quantile(valores, np.linspace(0, 1, N_CUBETAS + 1)[1:-1]))
+    bordes = np.asarray(bordes, dtype=np.float64)
+    conteos = np.bincount(cubetas(valores, bordes), minlength=len(bordes) + 1)
+    return {
+        "bordes": bordes.tolist(),
+        "proporciones": (conteos / conteos.sum()).tolist(),
+        "n": int(len(valores)),
+        "media": float(valores.mean()),
+        "desv": float(valores.std(ddof=1)) if len(valores) > 1 else 0.0,
+        "min": float(valores.min()),
+        "max": float(valores.max()),
+    }
+
+
+def perfil_referencia(X, probs: dict, dataset: str = "") -> dict:
+    """X (n x 5, orden VARIABLES) y {modelo: prob_anemia fuera de fold}."""
+    X = np.asarray(X, dtype=np.float64)
+    return {
+        "version": VERSION_PERFIL,
+        "dataset": dataset,
+        "variables": {v: perfil_variable(X[:, j]) for j, v in enumerate(VARIABLES)},
+        PROB: {m: perfil_variable(p, BORDES_PROB) for m, p in probs.items()},
+    }
+
+
+def leer_perfil(ruta):
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        perfil = json.load(f)
+    if perfil.get("version") != VERSION_PERFIL:
+        raise ValueError(f"Perfil de referencia {ruta} con versión {perfil.get('version')}; "
+                         f"se esperaba {VERSION_PERFIL}")
+    return perfil
+
+
+def psi(actual: np.ndarray, esperado: np.ndarray) -> float:
+    a = np.maximum(actual, EPSILON)
+    e = np.maximum(esperado, EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks_cubetas(actual: np.ndarray, esperado: np.ndarray) -> float:
+    """KS sobre las distribuciones acumuladas por cubeta (cota inferior del
+    KS exacto: solo se compara en los bordes)."""
+    return float(np.max(np.abs(np.cumsum(actual) - np.cumsum(esperado))))
+
+
+class Acumulador:
+    """Histograma de bordes fijos + Welford para las columnas de una matriz.
+
+    `n` es por columna: cuenta solo los valores finitos, que son los únicos
+    que entran en las cubetas y en las estadísticas; los demás quedan en
+    `no_finitos`.
+    """
+
+    def __init__(self, bordes: list):
+        self.bordes = [np.asarray(b, dtype=np.float64) for b in bordes]
+        k = len(self.bordes)
+        self.conteos = [np.zeros(len(b) + 1, dtype=np.int64) for b in self.bordes]
+        self.filas = 0
+        self.n = np.zeros(k, dtype=np.int64)
+        self.no_finitos = np.zeros(k, dtype=np.int64)
+        self.media = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+
+    def agregar(self, X: np.ndarray):
+        if not len(X):
+            return
+        self.filas += len(X)
+        finitos = np.isfinite(X)
+        if finitos.all():
+            self._sumar(X, slice(None))
+            return
+        # Caso raro: cada columna por separado, solo con sus valores finitos
+        self.no_finitos += len(X) - finitos.sum(axis=0)
+        for j in range(X.shape[1]):
+            self._sumar(X[finitos[:, j], j:j + 1], slice(j, j + 1))
+
+    def _sumar(self, X: np.ndarray, columnas: slice):
+        n_b = len(X)
+        if not n_b:
+            return
+        for j, x in zip(range(len(self.bordes))[columnas], X.T):
+            b = self.bordes[j]
+            self.conteos[j] += np.bincount(cubetas(x, b), minlength=len(b) + 1)
+        # Welford por bloques (Chan et al.): combinar (n, media, M2) del bloque
+        media_b = X.mean(axis=0)
+        m2_b = ((X - media_b) ** 2).sum(axis=0)
+        n_a = self.n[columnas]
+        n = n_a + n_b
+        delta = media_b - self.media[columnas]
+        self.media[columnas] += delta * n_b / n
+        self.m2[columnas] += m2_b + delta ** 2 * n_a * n_b / n
+        self.n[columnas] = n
+        self.min[columnas] = np.minimum(self.min[columnas], X.min(axis=0))
+        self.max[columnas] = np.maximum(self.max[columnas], X.max(axis=0))
+
+    def resumen(self, j: int, referencia=None) -> dict:
+        conteos = self.conteos[j]
+        n = int(self.n[j])
+        res = {
+            "n": n,
+            "no_finitos": int(self.no_finitos[j]),
+            "media": float(self.media[j]) if n else None,
+            "desv": float(np.sqrt(self.m2[j] / (n - 1))) if n > 1 else None,
+            "min": float(self.min[j]) if n else None,
+            "max": float(self.max[j]) if n else None,
+            "conteos": conteos.tolist(),
+        }
+        if referencia is not None and n:
+            actual = conteos / n
+            esperado = np.asarray(referencia["proporciones"])
+            res["psi"] = psi(actual, esperado)
+            res["ks"] = ks_cubetas(actual, esperado)
+            res["referencia"] = {k: referencia[k] for k in ("n", "media", "desv")}
+        return res
+
+
+class MonitorDeriva:
+    """Estadísticas acumuladas de las entradas y de prob_anemia por modelo.
+
+    `observar` se llama desde los handlers (event loop): guarda las
+    referencias y, cada `bloque` filas, las acumula de una vez.
+    """
+
+    def __init__(self, perfil=None, bloque: int = 1024, min_filas: int = 100):
+        self.perfil = perfil
+        self.bloque = bloque
+        self.min_filas = min_filas
+        # Sin perfil no hay bordes: solo estadísticas (una cubeta)
+        self._bordes_x = [perfil["variables"][v]["bordes"] if perfil else [] for v in VARIABLES]
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.entradas = Acumulador(self._bordes_x)
+        self.probs = {}  # modelo -> Acumulador de 1 columna
+        self._bufer = []
+        self._en_bufer = 0
+
+    def observar(self, X, probs, modelo: str):
+        """X: filas de 5 valores (orden VARIABLES); probs: una por fila."""
+        self._bufer.append((X, probs, modelo))
+        self._en_bufer += len(probs)
+        if self._en_bufer >= self.bloque:
+            self._acumular()
+
+    def _acumular(self):
+        bufer, self._bufer, self._en_bufer = self._bufer, [], 0
+        if not bufer:
+            return
+        self.entradas.agregar(np.concatenate([np.asarray(X, dtype=np.float64).reshape(-1, len(VARIABLES))
+                                              for X, _, _ in bufer]))
+        por_modelo = {}
+        for _, p, modelo in bufer:
+            por_modelo.setdefault(modelo, []).append(np.asarray(p, dtype=np.float64).ravel())
+        for modelo, partes in por_modelo.items():
+            if modelo not in self.probs:
+                self.probs[modelo] = Acumulador([BORDES_PROB])
+            self.probs[modelo].agregar(np.concatenate(partes)[:, None])
+
+    @staticmethod
+    def _estado(res: dict, min_filas: int) -> str:
+        if "psi" not in res:
+            return "sin_referencia"
+        if res["n"] < min_filas:
+            return "insuficiente"
+        if res["psi"] >= PSI_SIGNIFICATIVA:
+            return "significativa"
+        if res["psi"] >= PSI_MODERADA:
+            return "moderada"
+        return "estable"
+
+    def reporte(self) -> dict:
+        self._acumular()
+        ref = self.perfil or {}
+        variables = {}
+        for j, v in enumerate(VARIABLES):
+            res = self.entradas.resumen(j, ref.get("variables", {}).get(v))
+            res["estado"] = self._estado(res, self.min_filas)
+            variables[v] = res
+        probs = {}
+        for modelo, acum in self.probs.items():
+            res = acum.resumen(0, ref.get(PROB, {}).get(modelo.split("@")[0]))
+            res["estado"] = self._estado(res, self.min_filas)
+            probs[modelo] = res
+        return {
+            "perfil": {"cargado": self.perfil is not None, "dataset": ref.get("dataset")},
+            "filas": self.entradas.filas,
+            "variables": variables,
+            PROB: probs,
+        }
+
+    def psi_por_serie(self) -> dict:
+        """{(variable, modelo): psi} para /metrics (modelo vacío en las entradas).
+        Con menos de `min_filas` no se exporta: el PSI de pocas filas es ruido."""
+        reporte = self.reporte()
+        series = {}
+        for (variable, modelo), r in [((v, ""), r) for v, r in reporte["variables"].items()] + \
+                [((PROB, m), r) for m, r in reporte[PROB].items()]:
+            if r["estado"] not in ("sin_referencia", "insuficiente"):
+                series[variable, modelo] = r["psi"]
+        return series
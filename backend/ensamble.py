@@ -0,0 +1,252 @@
+# =========================
+# Ensamble de modelos calibrados
+# =========================
+# Con ENSAMBLE_MODELOS (p. ej. "randomforest,histgradientboosting,
+# logisticregression") prob_anemia es el promedio (ponderado) de las
+# probabilidades CALIBRADAS de esos modelos sobre la MISMA matriz de
+# entrada. La calibración la ajusta ml/calibracion.py
+# (Modelos/calibracion.json) y por modelo es una de dos: nodos de una
+# isotónica (np.interp) o una sigmoide de Platt, expit(a * p + b), cuando
+# el conjunto de calibración es chico para la isotónica.
+#
+# Los miembros corren en paralelo. Las peticiones individuales tienen un
+# presupuesto de latencia: los que no terminaron dentro de `presupuesto_ms`
+# quedan fuera de esa respuesta (se promedian los que sí llegaron y se
+# devuelven sus nombres en `omitidos`); si no llegó ninguno, se espera al
+# primero. Los lotes y archivos no tienen presupuesto (`completo`): esperan
+# a todos los miembros, así el resultado no depende de la carga del momento.
+#
+# Un miembro fuera de presupuesto no debe acumular trabajo: al vencer el
+# presupuesto se cancelan sus tareas que aún no empezaron, y mientras tenga
+# `hilos` tareas en curso las peticiones individuales lo omiten sin
+# encolarle otra.
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from inferencia import indice_positivo
+from modelos_numpy import expit
+
+logger = logging.getLogger(__name__)
+
+NOMBRE = "ensamble"
+VERSION_CALIBRACION = 2
+METODOS = ("isotonica", "sigmoide")
+
+
+def leer_calibracion(ruta) -> dict:
+    """{modelo: ("isotonica", x, y) | ("sigmoide", a, b)} de
+    calibracion.json; {} si no existe."""
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return {}
+    datos = json.loads(ruta.read_text(encoding="utf-8"))
+    if datos.get("version") != VERSION_CALIBRACION:
+        raise ValueError(f"Calibración {ruta} con versión {datos.get('version')}; "
+                         f"se esperaba {VERSION_CALIBRACION} (volver a correr ml/calibracion.py)")
+    tablas = {}
+    for nombre, m in datos["modelos"].items():
+        if m.get("metodo") not in METODOS:
+            raise ValueError(f"Calibración de {nombre}: método desconocido {m.get('metodo')!r}")
+        if m["metodo"] == "isotonica":
+            tablas[nombre] = ("isotonica", np.asarray(m["x"], dtype=np.float64),
+                              np.asarray(m["y"], dtype=np.float64))
+        else:
+            tablas[nombre] = ("sigmoide", float(m["a"]), float(m["b"]))
+    return tablas
+
+
+def calibrar(tabla, prob: np.ndarray) -> np.ndarray:
+    metodo, p1, p2 = tabla
+    if metodo == "isotonica":
+        return np.interp(prob, p1, p2)
+    return expit(p1 * prob + p2)
+
+
+def _huella(tabla) -> bytes:
+    metodo, p1, p2 = tabla
+    if metodo == "isotonica":
+        return metodo.encode() + p1.tobytes() + p2.tobytes()
+    return f"{metodo}:{p1!r}:{p2!r}".encode()
+
+
+class Ensamble:
+    """Se comporta como un modelo (classes_ + predict_proba) para que el
+    resto del servidor (micro-lotes, caché, archivos) lo use sin cambios.
+
+    `registro` entrega los modelos miembro (cargados y recargados como
+    cualquier otro); `hilos` acota cuántos ensambles corren a la vez (uno
+    por hilo del pool de inferencia).
+    """
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, registro, miembros, pesos=None, calibracion=None,
+                 presupuesto_ms: float = 50.0, hilos: int = 1):
+        if not miembros:
+            raise ValueError("El ensamble necesita al menos un modelo")
+        pesos = list(pesos) if pesos else [1.0] * len(miembros)
+        if len(pesos) != len(miembros) or min(pesos) <= 0:
+            raise ValueError("Un peso > 0 por modelo del ensamble")
+        if presupuesto_ms <= 0:
+            raise ValueError("presupuesto_ms debe ser > 0")
+        self.registro = registro
+        self.miembros = list(miembros)
+        self.pesos = dict(zip(self.miembros, map(float, pesos)))
+        self.calibracion = {n: t for n, t in (calibracion or {}).items() if n in self.miembros}
+        self.presupuesto = presupuesto_ms / 1000.0
+        sin_tabla = [n for n in self.miembros if n not in self.calibracion]
+        if sin_tabla:
+            logger.warning("Ensamble: sin calibración para %s (se usa la probabilidad cruda)", sin_tabla)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.miembros) * max(1, hilos),
+                                            thread_name_prefix="ensamble")
+        self._huella_calibracion = hashlib.sha256(b"".join(
+            n.encode() + _huella(t) for n, t in sorted(self.calibracion.items()))).hexdigest()
+        self._lock = threading.Lock()  # contadores: varios hilos del pool a la vez
+        self._max_en_vuelo = max(1, hilos)
+        self._en_vuelo = {n: 0 for n in self.miembros}  # tareas encoladas o corriendo
+
+        self.llamadas = 0
+        self.parciales = 0  # llamadas que respondieron sin algún miembro
+        self.omitidos = {n: 0 for n in self.miembros}
+        self.errores = {n: 0 for n in self.miembros}
+        self.completo = EnsambleCompleto(self)
+
+    # ---------- como ModeloCargado ----------
+    @property
+    def modelo(self):
+        return self
+
+    @property
+    def version(self):
+        # Cambia si se recarga un miembro (huella del artefacto) o la
+        # calibración; None si algún miembro no está en memoria
+        versiones = [self.registro.version(n) for n in self.miembros]
+        if None in versiones:
+            return None
+        partes = [f"{n}={v}:{self.pesos[n]}" for n, v in zip(self.miembros, versiones)]
+        partes.append(self._huella_calibracion)
+        return f"{NOMBRE}@{hashlib.sha256('|'.join(partes).encode()).hexdigest()[:12]}"
+
+    def info(self) -> dict:
+        return {
+            "miembros": self.miembros,
+            "pesos": self.pesos,
+            "calibrados": {n: t[0] for n, t in sorted(self.calibracion.items())},
+            "presupuesto_ms": self.presupuesto * 1000,
+            "llamadas": self.llamadas,
+            "parciales": self.parciales,
+            "omitidos": self.omitidos,
+            "errores": self.errores,
+            "en_vuelo": dict(self._en_vuelo),
+        }
+
+    # ---------- inferencia ----------
+    def _prob_miembro(self, nombre: str, X: np.ndarray) -> np.ndarray:
+        modelo = self.registro.obtener(nombre).para_filas(len(X))
+        prob = modelo.predict_proba(X)[:, indice_positivo(modelo)]
+        tabla = self.calibracion.get(nombre)
+        return calibrar(tabla, prob) if tabla is not None else prob
+
+    def _combinar(self, listos, futuros, n: int):
+        suma = np.zeros(n)
+        peso_total = 0.0
+        fallidos = []
+        for fut in listos:
+            nombre = futuros[fut]
+            try:
+                prob = fut.result()
+            except Exception:
+                logger.exception("Ensamble: falló %s", nombre)
+                with self._lock:
+                    self.errores[nombre] += 1
+                fallidos.append(nombre)
+                continue
+            suma += self.pesos[nombre] * prob
+            peso_total += self.pesos[nombre]
+        return suma, peso_total, fallidos
+
+    def evaluar(self, X, presupuesto: bool = True):
+        """(prob_anemia, omitidos): `omitidos` son los miembros que quedaron
+        fuera del promedio (fuera de presupuesto o con error), en el orden
+        de `miembros`. Sin presupuesto se espera a todos y un miembro que
+        falla es un error: el resultado siempre es el del ensamble completo."""
+        # Una sola matriz para todos los miembros
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        inicio = time.perf_counter()
+        lanzar, saltados = self.miembros, []
+        if presupuesto:
+            with self._lock:
+                saltados = [n for n in self.miembros if self._en_vuelo[n] >= self._max_en_vuelo]
+            if len(saltados) < len(self.miembros):
+                lanzar = [n for n in self.miembros if n not in saltados]
+            else:
+                saltados = []  # todos atrasados: esperar igual que sin cola
+        futuros = {self._lanzar(n, X): n for n in lanzar}
+        if presupuesto:
+            listos, pendientes = wait(futuros, timeout=self.presupuesto)
+            if not listos:
+                listos, pendientes = wait(futuros, return_when=FIRST_COMPLETED)
+        else:
+            listos, pendientes = wait(futuros)
+
+        suma, peso_total, fallidos = self._combinar(listos, futuros, X.shape[0])
+        if fallidos and not presupuesto:
+            raise RuntimeError(f"Ensamble: fallaron {fallidos}")
+        if peso_total == 0.0 and pendientes:
+            # Los que llegaron fallaron: esperar a los demás antes de rendirse
+            suma, peso_total, mas = self._combinar(wait(pendientes)[0], futuros, X.shape[0])
+            fallidos += mas
+            pendientes = set()
+        if peso_total == 0.0:
+            raise RuntimeError(f"Ningún modelo del ensamble respondió "
+                               f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+        fuera = {futuros[f] for f in pendientes} | set(fallidos) | set(saltados)
+        for fut in pendientes:
+            # Si ya empezó sigue en su hilo, pero esta respuesta no lo espera
+            fut.cancel()
+        with self._lock:
+            self.llamadas += 1
+            self.parciales += bool(fuera)
+            for nombre in [futuros[f] for f in pendientes] + saltados:
+                self.omitidos[nombre] += 1
+        return suma / peso_total, tuple(n for n in self.miembros if n in fuera)
+
+    def _lanzar(self, nombre: str, X: np.ndarray):
+        with self._lock:
+            self._en_vuelo[nombre] += 1
+        futuro = self._executor.submit(self._prob_miembro, nombre, X)
+        # También corre si se cancela antes de empezar
+        futuro.add_done_callback(lambda _: self._terminar(nombre))
+        return futuro
+
+    def _terminar(self, nombre: str):
+        with self._lock:
+            self._en_vuelo[nombre] -= 1
+
+    def predict_proba(self, X, presupuesto: bool = True) -> np.ndarray:
+        prob, _ = self.evaluar(X, presupuesto)
+        return np.column_stack([1.0 - prob, prob])
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
+
+
+class EnsambleCompleto:
+    """El mismo ensamble sin presupuesto, con la interfaz de un modelo
+    (para puntuar_bloque en los archivos)."""
+
+    classes_ = Ensamble.classes_
+
+    def __init__(self, ensamble: Ensamble):
+        self.ensamble = ensamble
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.ensamble.predict_proba(X, presupuesto=False)
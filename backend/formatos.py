@@ -0,0 +1,119 @@
+# =========================
+# Formatos de respuesta (negociación por Accept)
+# =========================
+# El resultado de una predicción es, en el fondo, un bool, un código de
+# severidad y una probabilidad. La respuesta completa (mensaje,
+# recomendaciones en texto, valores ingresados) sigue siendo la de siempre
+# para el frontend; las integraciones de alto volumen pueden pedir:
+#
+#   Accept: application/json                       -> completa (orjson)
+#   Accept: application/vnd.anemia.compacto+json   -> códigos, sin textos
+#   Accept: application/msgpack                    -> códigos en MessagePack;
+#                                                     en lote, arreglos empaquetados
+#
+# El código de severidad es el índice en NIVELES y también el de
+# RECOMENDACIONES (ver GET /api/codigos para traducirlos a texto).
+import msgpack
+import numpy as np
+import orjson
+from fastapi.responses import Response
+
+from clinica import NIVELES, RECOMENDACIONES
+
+JSON = "application/json"
+COMPACTO = "application/vnd.anemia.compacto+json"
+MSGPACK = "application/msgpack"
+# Alias aceptados en Accept -> formato canónico
+TIPOS = {
+    JSON: JSON,
+    "application/*": JSON,
+    "*/*": JSON,
+    COMPACTO: COMPACTO,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+MENSAJES = (
+    "No hay indicios de anemia según el modelo.",
+    "El modelo sugiere presencia de anemia.",
+)
+
+
+def negociar(accept) -> str:
+    """Elige el formato según el header Accept (calidad q); JSON si no hay
+    coincidencia: un cliente que no lo pide recibe siempre lo de siempre."""
+    if not accept:
+        return JSON
+    opciones = []
+    for i, parte in enumerate(accept.split(",")):
+        tipo, *params = [p.strip() for p in parte.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if tipo.lower() in TIPOS and q > 0:
+            opciones.append((-q, i, TIPOS[tipo.lower()]))
+    return min(opciones)[2] if opciones else JSON
+
+
+def resultado_completo(datos: dict, tiene: bool, prob: float, codigo: int) -> dict:
+    # Mismo contenido que AnemiaResult
+    return {
+        "tiene_anemia": bool(tiene),
+        "nivel_severidad": NIVELES[codigo],
+        "prob_anemia": round(float(prob), 4),
+        "mensaje": MENSAJES[bool(tiene)],
+        "recomendaciones": list(RECOMENDACIONES[codigo]),
+        "valores_ingresados": datos,
+    }
+
+
+def responder(formato: str, datos: dict, tiene: bool, prob: float, codigo: int) -> Response:
+    """Respuesta de UNA predicción en el formato negociado."""
+    if formato == JSON:
+        return Response(orjson.dumps(resultado_completo(datos, tiene, prob, codigo)), media_type=JSON)
+    compacto = {"tiene_anemia": bool(tiene), "severidad": int(codigo), "prob_anemia": round(float(prob), 4)}
+    if formato == MSGPACK:
+        return Response(msgpack.packb(compacto), media_type=MSGPACK)
+    return Response(orjson.dumps(compacto), media_type=COMPACTO)
+
+
+def responder_lote(formato: str, datos: list, tiene, probs, codigos) -> Response:
+    """Respuesta de un lote: en los formatos compactos, por columnas.
+
+    En MessagePack cada columna es un arreglo empaquetado (bytes):
+    tiene_anemia y severidad uint8, prob_anemia float32 little-endian; con
+    NumPy se leen con np.frombuffer(valor, dtype).
+    """
+    tiene = np.asarray(tiene, dtype=bool)
+    probs = np.asarray(probs, dtype=np.float64)
+    codigos = np.asarray(codigos, dtype=np.uint8)
+    if formato == JSON:
+        return Response(orjson.dumps([
+            resultado_completo(d, t, p, c)
+            for d, t, p, c in zip(datos, tiene.tolist(), probs.tolist(), codigos.tolist())
+        ]), media_type=JSON)
+    if formato == MSGPACK:
+        return Response(msgpack.packb({
+            "n": len(codigos),
+            "tiene_anemia": tiene.astype(np.uint8).tobytes(),
+            "severidad": codigos.tobytes(),
+            "prob_anemia": probs.astype("<f4").tobytes(),
+        }), media_type=MSGPACK)
+    return Response(orjson.dumps({
+        "tiene_anemia": tiene.tolist(),
+        "severidad": codigos.tolist(),
+        "prob_anemia": [round(p, 4) for p in probs.tolist()],
+    }), media_type=COMPACTO)
+
+
+def codigos() -> dict:
+    return {
+        "severidad": list(NIVELES),
+        "recomendaciones": [list(r) for r in RECOMENDACIONES],
+        "mensajes": {"false": MENSAJES[0], "true": MENSAJES[1]},
+    }
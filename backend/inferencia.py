@@ -0,0 +1,84 @@
+# =========================
+# Capa de inferencia
+# =========================
+# Evalúa el modelo UNA sola vez por llamada: la clase se deriva de
+# predict_proba con un umbral configurable, en lugar de correr
+# model.predict y model.predict_proba (dos pasadas por los 300 árboles).
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def indice_positivo(modelo) -> int:
+    # Columna de predict_proba que corresponde a "con anemia" (clase 1)
+    return list(modelo.classes_).index(1)
+
+
+def predecir(modelo, X: np.ndarray, umbral: float = 0.5):
+    """Devuelve (tiene_anemia, prob_anemia) como arreglos de largo len(X).
+
+    Con umbral=0.5 coincide con model.predict: ante un empate exacto
+    sklearn elige la clase 0, por eso la comparación es estricta.
+    """
+    probas = modelo.predict_proba(X)
+    prob = probas[:, indice_positivo(modelo)]
+    return prob > umbral, prob
+
+
+# =========================
+# Pool acotado de inferencia
+# =========================
+
+class SaturacionInferencia(Exception):
+    """El pool está lleno: hay que rechazar la petición (503)."""
+
+
+class PoolInferencia:
+    """Ejecuta la inferencia fuera del event loop, en un pool de hilos.
+
+    Se usan hilos (y no procesos) porque sklearn libera el GIL al recorrer
+    los árboles y así todos los workers comparten UNA copia del modelo.
+    Como máximo hay `workers` predicciones corriendo y `cola` esperando;
+    por encima de eso se lanza SaturacionInferencia en vez de encolar
+    sin límite.
+    """
+
+    def __init__(self, workers: int, cola: int):
+        if workers < 1 or cola < 0:
+            raise ValueError("workers debe ser >= 1 y cola >= 0")
+        self.workers = workers
+        self.cola = cola
+        self.en_curso = 0  # solo se toca desde el event loop
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inferencia")
+
+    @property
+    def capacidad(self) -> int:
+        return self.workers + self.cola
+
+    async def ejecutar(self, fn, *args):
+        if self.en_curso >= self.capacidad:
+            raise SaturacionInferencia(
+                f"Pool de inferencia saturado ({self.en_curso}/{self.capacidad})"
+            )
+        loop = asyncio.get_running_loop()
+        futuro = self._executor.submit(fn, *args)
+        self.en_curso += 1
+        # El lugar se libera cuando TERMINA el trabajo en su hilo, no cuando
+        # se deja de esperarlo: si el cliente se desconecta, el hilo sigue
+        # ocupado hasta el final y tiene que seguir contando.
+        futuro.add_done_callback(lambda _: self._liberar(loop))
+        return await asyncio.wrap_future(futuro, loop=loop)
+
+    def _liberar(self, loop):
+        # Se llama desde el hilo del trabajo: en_curso solo se toca en el loop
+        try:
+            loop.call_soon_threadsafe(self._decrementar)
+        except RuntimeError:
+            pass  # loop cerrado (apagado): ya no hay a quién avisar
+
+    def _decrementar(self):
+        self.en_curso -= 1
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,83 @@
+# =========================
+# Puntuación de archivos completos (CSV de laboratorio)
+# =========================
+# El archivo se lee por bloques de filas: cada bloque es UNA llamada
+# vectorizada al modelo y se escribe apenas está listo, así la memoria no
+# crece con el tamaño del archivo. Lo usan la ruta
+# /api/analizar-anemia/archivo y la herramienta puntuar_archivo.py.
+import itertools
+import json
+
+import numpy as np
+
+from clinica import NIVELES, severidad_codigos
+from inferencia import predecir
+
+# Mismo ORDEN de columnas del entrenamiento (ml/data/anemia_clean.csv)
+COLUMNAS = ("Gender", "Hemoglobin", "MCH", "MCHC", "MCV")
+FILAS_POR_BLOQUE = 20000
+FORMATOS = ("csv", "ndjson")
+
+
+class LectorCSV:
+    """Lee un CSV (";" o ",") y entrega bloques de filas como matrices.
+
+    Las columnas se buscan por nombre en el encabezado; si hay otras (p. ej.
+    Result) se ignoran. `archivo` es cualquier iterable de líneas de texto.
+    """
+
+    def __init__(self, archivo, filas_por_bloque: int = FILAS_POR_BLOQUE):
+        self.archivo = iter(archivo)
+        self.filas_por_bloque = filas_por_bloque
+        encabezado = next(self.archivo, "").strip()
+        if not encabezado:
+            raise ValueError("El archivo está vacío")
+        self.sep = ";" if encabezado.count(";") > encabezado.count(",") else ","
+        nombres = [c.strip() for c in encabezado.split(self.sep)]
+        faltan = [c for c in COLUMNAS if c not in nombres]
+        if faltan:
+            raise ValueError(f"Faltan columnas en el CSV: {faltan}")
+        self.indices = [nombres.index(c) for c in COLUMNAS]
+
+    def __iter__(self):
+        while True:
+            lineas = list(itertools.islice(self.archivo, self.filas_por_bloque))
+            if not lineas:
+                return
+            X = np.loadtxt(lineas, delimiter=self.sep, usecols=self.indices, dtype=float, ndmin=2)
+            if len(X):
+                yield X
+
+
+def puntuar_bloque(modelo, X: np.ndarray, umbral: float):
+    """Una llamada al modelo por bloque + códigos de severidad vectorizados."""
+    tiene, prob = predecir(modelo, X, umbral)
+    return X, tiene, prob, severidad_codigos(X[:, 0], X[:, 1])
+
+
+def _num(v: float) -> str:
+    return f"{v:.10g}"
+
+
+def encabezado_salida(formato: str, sep: str = ";") -> str:
+    if formato == "csv":
+        return sep.join(COLUMNAS + ("tiene_anemia", "prob_anemia", "nivel_severidad")) + "\n"
+    return ""
+
+
+def formatear_bloque(resultado, formato: str, sep: str = ";") -> str:
+    X, tiene, prob, severidad = resultado
+    lineas = []
+    if formato == "csv":
+        for fila, t, p, s in zip(X, tiene, prob, severidad):
+            valores = [str(int(fila[0]))] + [_num(v) for v in fila[1:]]
+            lineas.append(sep.join(valores + [str(int(t)), _num(round(float(p), 4)), NIVELES[s]]))
+    else:
+        for fila, t, p, s in zip(X, tiene, prob, severidad):
+            lineas.append(json.dumps({
+                **dict(zip(COLUMNAS, [int(fila[0])] + [float(v) for v in fila[1:]])),
+                "tiene_anemia": bool(t),
+                "prob_anemia": round(float(p), 4),
+                "nivel_severidad": NIVELES[s],
+            }, ensure_ascii=False))
+    return "\n".join(lineas) + "\n" if lineas else ""
@@ -0,0 +1,212 @@
+# =========================
+# Métricas estilo Prometheus (/metrics)
+# =========================
+# Contadores, histogramas y medidores en memoria con salida en el formato
+# de texto de Prometheus (sin dependencias). Los histogramas se actualizan
+# desde el event loop y desde los hilos del pool de inferencia: cada métrica
+# tiene su lock.
+#
+# Las etapas de una predicción (validación, armado de la matriz, inferencia,
+# serialización) se miden con un ContextVar que abre MiddlewareMetricas al
+# recibir la petición: el handler y el middleware corren en la misma tarea
+# y ven los mismos tiempos.
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Latencias de API (segundos): de 100 µs a 10 s
+CUBETAS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres, valores, extra=()) -> str:
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exportar(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        with self._lock:
+            valores = list(self._valores.items())
+        for clave, v in valores:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_num(v)}"
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas=(), cubetas=CUBETAS_LATENCIA):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.cubetas = tuple(sorted(cubetas))
+        self._series = {}  # etiquetas -> [conteos por cubeta (+Inf al final), suma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores):
+        i = bisect.bisect_left(self.cubetas, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.cubetas) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        with self._lock:
+            series = [(k, list(c), s) for k, (c, s) in self._series.items()]
+        for clave, conteos, suma in series:
+            acumulado = 0
+            for limite, n in zip(self.cubetas + (float("inf"),), conteos):
+                acumulado += n
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [('le', _num(limite))])} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_num(suma)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {acumulado}"
+
+
+class Medidor:
+    """Valor que se lee al exportar: fn() -> número o {valores_etiquetas: número}.
+
+    tipo="counter" para contadores que ya lleva otro objeto (p. ej. la caché).
+    """
+
+    def __init__(self, nombre: str, ayuda: str, fn, etiquetas=(), tipo: str = "gauge"):
+        self.nombre, self.ayuda, self.fn, self.etiquetas = nombre, ayuda, fn, tuple(etiquetas)
+        self.tipo = tipo
+
+    def exportar(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} {self.tipo}"
+        valor = self.fn()
+        series = valor.items() if isinstance(valor, dict) else [((), valor)]
+        for clave, v in series:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_num(v)}"
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = []
+
+    def agregar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        lineas = []
+        for m in self._metricas:
+            lineas.extend(m.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+# =========================
+# Métricas de la API
+# =========================
+metricas = RegistroMetricas()
+
+latencia_peticion = metricas.agregar(Histograma(
+    "anemia_peticion_segundos", "Latencia total de la petición HTTP", ("ruta", "metodo", "estado")))
+latencia_etapa = metricas.agregar(Histograma(
+    "anemia_etapa_segundos",
+    "Tiempo por etapa: validacion, caracteristicas, inferencia, serializacion", ("ruta", "etapa")))
+predicciones = metricas.agregar(Contador(
+    "anemia_predicciones_total", "Predicciones por nivel de severidad y versión del modelo",
+    ("severidad", "version")))
+
+
+# =========================
+# Etapas de la petición
+# =========================
+_peticion = ContextVar("peticion_metricas", default=None)
+
+
+def _ruta(scope) -> str:
+    # Plantilla de la ruta ("/api/analizar-anemia"), nunca la URL cruda:
+    # acota la cantidad de series
+    ruta = scope.get("route")
+    return getattr(ruta, "path", None) or "sin_ruta"
+
+
+@contextmanager
+def etapa(nombre: str):
+    """Mide un bloque del handler como etapa (sin efecto fuera de una petición)."""
+    actual = _peticion.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if actual is not None:
+            latencia_etapa.observar(time.perf_counter() - t0, _ruta(actual["scope"]), nombre)
+            actual["etapas"].add(nombre)
+
+
+def instrumentado(handler):
+    """Decorador de rutas: "validacion" = desde que llega la petición hasta
+    que entra el handler (leer el cuerpo + pydantic); "serializacion" = desde
+    que sale hasta que empieza la respuesta (response_model + JSON), salvo
+    que el handler ya la haya medido con `etapa("serializacion")`."""
+    @wraps(handler)
+    async def envoltura(*args, **kwargs):
+        actual = _peticion.get()
+        if actual is not None:
+            latencia_etapa.observar(time.perf_counter() - actual["inicio"], _ruta(actual["scope"]), "validacion")
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            if actual is not None:
+                actual["fin_handler"] = time.perf_counter()
+    return envoltura
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro: latencia total por ruta/estado y el contexto
+    que usan `etapa` e `instrumentado`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        actual = {"inicio": time.perf_counter(), "scope": scope, "fin_handler": None, "estado": 500,
+                  "etapas": set()}
+        token = _peticion.set(actual)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                actual["estado"] = mensaje["status"]
+                if actual["fin_handler"] is not None and "serializacion" not in actual["etapas"]:
+                    latencia_etapa.observar(time.perf_counter() - actual["fin_handler"],
+                                            _ruta(scope), "serializacion")
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _peticion.reset(token)
+            latencia_peticion.observar(time.perf_counter() - actual["inicio"],
+                                       _ruta(scope), scope["method"], actual["estado"])
@@ -0,0 +1,154 @@
+# =========================
+# Micro-lotes de inferencia
+# =========================
+# Con 5 variables, el costo fijo de cada llamada a predict_proba pesa más
+# que el cálculo en sí. Las peticiones individuales que llegan casi al mismo
+# tiempo se juntan en una sola matriz y se evalúan en UNA llamada al modelo;
+# cada petición recibe su fila del resultado a través de su future.
+import asyncio
+import time
+
+import numpy as np
+
+from inferencia import SaturacionInferencia
+
+
+class MicroLotes:
+    """Agrupa filas durante `ventana_ms` (o hasta `max_filas`) y predice juntas.
+
+    `fn(X, clave)` recibe la matriz apilada y la clave con que se encolaron
+    las filas (p. ej. el modelo elegido) y devuelve (tiene_anemia,
+    prob_anemia) como arreglos, más opcionalmente datos del lote entero
+    (p. ej. los miembros omitidos del ensamble) que reciben todas sus filas;
+    se ejecuta en el pool de inferencia para no bloquear el event loop. Filas con claves distintas nunca se mezclan.
+    Si la cola supera `max_cola` se rechaza con SaturacionInferencia, igual
+    que el pool.
+    """
+
+    def __init__(self, pool, fn, ventana_ms: float = 2.0, max_filas: int = 64, max_cola: int = 1024):
+        if ventana_ms < 0 or max_filas < 1 or max_cola < 1:
+            raise ValueError("ventana_ms >= 0, max_filas >= 1 y max_cola >= 1")
+        self.pool = pool
+        self.fn = fn
+        self.ventana = ventana_ms / 1000.0
+        self.max_filas = max_filas
+        self.max_cola = max_cola
+        self._cola = None
+        self._tarea = None
+        self._pendientes = set()
+
+        # Métricas para ajustar ventana/tamaño (throughput vs latencia)
+        self.lotes = 0
+        self.filas = 0
+        self.tamano_max = 0
+        self.tamanos = {}  # potencia de 2 superior -> cantidad de lotes
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    # ---------- ciclo de vida ----------
+    async def iniciar(self):
+        self._cola = asyncio.Queue()
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        if self._pendientes:
+            await asyncio.gather(*self._pendientes, return_exceptions=True)
+        # Lo que quedó en cola ya no se va a procesar
+        while self._cola is not None and not self._cola.empty():
+            _, _, fut, _ = self._cola.get_nowait()
+            if not fut.done():
+                fut.set_exception(SaturacionInferencia("Servidor cerrándose"))
+
+    # ---------- API ----------
+    @property
+    def en_cola(self) -> int:
+        return self._cola.qsize() if self._cola is not None else 0
+
+    async def predecir(self, fila: np.ndarray, clave=None):
+        """Encola una fila (5 valores) y espera (tiene_anemia, prob_anemia, *extra)."""
+        if self._tarea is None:
+            raise RuntimeError("MicroLotes no iniciado (falta iniciar() en el startup)")
+        if self._cola.qsize() >= self.max_cola:
+            raise SaturacionInferencia(f"Cola de micro-lotes llena ({self.max_cola})")
+        fut = asyncio.get_running_loop().create_future()
+        self._cola.put_nowait((fila, clave, fut, time.perf_counter()))
+        return await fut
+
+    def metricas(self) -> dict:
+        return {
+            "lotes": self.lotes,
+            "filas": self.filas,
+            "tamano_promedio": self.filas / self.lotes if self.lotes else 0.0,
+            "tamano_max": self.tamano_max,
+            "histograma_tamano": dict(sorted(self.tamanos.items())),
+            "espera_promedio_ms": 1000 * self.espera_total / self.filas if self.filas else 0.0,
+            "espera_max_ms": 1000 * self.espera_max,
+            "en_cola": self.en_cola,
+            "ventana_ms": 1000 * self.ventana,
+            "max_filas": self.max_filas,
+        }
+
+    # ---------- interno ----------
+    async def _bucle(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._cola.get()]
+            limite = loop.time() + self.ventana
+            while len(lote) < self.max_filas:
+                # Primero lo que ya está en cola, sin esperar
+                if not self._cola.empty():
+                    lote.append(self._cola.get_nowait())
+                    continue
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            # El lote se procesa en segundo plano: mientras tanto se sigue
+            # armando el siguiente (el pool limita cuántos corren a la vez).
+            tarea = asyncio.create_task(self._procesar(lote))
+            self._pendientes.add(tarea)
+            tarea.add_done_callback(self._pendientes.discard)
+
+    async def _procesar(self, lote):
+        ahora = time.perf_counter()
+        n = len(lote)
+        self.lotes += 1
+        self.filas += n
+        self.tamano_max = max(self.tamano_max, n)
+        cubeta = 1 << (n - 1).bit_length()
+        self.tamanos[cubeta] = self.tamanos.get(cubeta, 0) + 1
+        grupos = {}
+        for item in lote:
+            espera = ahora - item[3]
+            self.espera_total += espera
+            if espera > self.espera_max:
+                self.espera_max = espera
+            grupos.setdefault(item[1], []).append(item)
+
+        await asyncio.gather(*(self._resolver(clave, items) for clave, items in grupos.items()))
+
+    async def _resolver(self, clave, items):
+        try:
+            X = np.vstack([fila for fila, _, _, _ in items])
+            tiene, prob, *extra = await self.pool.ejecutar(self.fn, X, clave)
+        except Exception as e:
+            for _, _, fut, _ in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for (_, _, fut, _), t, p in zip(items, tiene, prob):
+            # El cliente pudo haberse desconectado (future cancelado)
+            if not fut.done():
+                fut.set_result((bool(t), float(p), *extra))
@@ -0,0 +1,354 @@
+# =========================
+# Carga de modelos
+# =========================
+# Los modelos no se cargan al importar server.py: se cargan la primera vez
+# que se necesitan (o en segundo plano al arrancar) y con mmap_mode="r",
+# de modo que los arreglos quedan mapeados desde el archivo y los workers
+# de uvicorn comparten esas páginas en vez de tener cada uno su copia.
+import hashlib
+import logging
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+
+from modelos_numpy import cargar_modelo_numpy, es_modelo_numpy
+
+logger = logging.getLogger(__name__)
+
+# Tipos de .npmodel cuyo .pkl rinde más en bloques grandes: en bosques y
+# árboles sklearn es ~4x más rápido desde unas 1000 filas; en gradiente y
+# lineal no gana (y el gradiente abre sus propios hilos OpenMP).
+TIPOS_PKL_LOTES = {"bosque", "arbol"}
+
+
+def nombre_modelo(ruta: Path) -> str:
+    # "modelo_randomforest_train90.pkl" -> "randomforest"
+    return ruta.name.split(".")[0][len("modelo_"):].replace("_train90", "")
+
+
+def huella(ruta: Path) -> str:
+    """Identidad del artefacto: sha256 (12 hex) de su contenido."""
+    h = hashlib.sha256()
+    archivos = sorted(p for p in ruta.iterdir() if p.is_file()) if ruta.is_dir() else [ruta]
+    for archivo in archivos:
+        h.update(archivo.name.encode())
+        with open(archivo, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+    return h.hexdigest()[:12]
+
+
+class ModeloCargado:
+    def __init__(self, nombre: str, ruta: Path, modelo, formato: str, segundos_carga: float, mmap: bool,
+                 ruta_pkl: Path = None, filas_pkl: int = 0):
+        self.nombre = nombre
+        self.ruta = ruta
+        self.modelo = modelo
+        self.formato = formato
+        self.segundos_carga = segundos_carga
+        self.mmap = mmap
+        self.huella = huella(ruta)
+        self.ruta_pkl = ruta_pkl
+        self.filas_pkl = filas_pkl
+        self._pkl = None
+        self._lock_pkl = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return f"{self.nombre}@{self.huella}"
+
+    def para_filas(self, filas: int):
+        """El estimador para un bloque de `filas`.
+
+        El .npmodel gana en pocas filas (sin el costo fijo de sklearn), pero
+        en bloques grandes los árboles en Cython de sklearn son 2-4x más
+        rápidos que los gathers de NumPy. Desde `filas_pkl` filas se usa el
+        .pkl hermano (solo TIPOS_PKL_LOTES), cargado la primera vez que hace
+        falta; las probabilidades son las mismas bit a bit.
+        """
+        if self.ruta_pkl is None or filas < self.filas_pkl:
+            return self.modelo
+        if self._pkl is None:
+            with self._lock_pkl:
+                if self._pkl is None and self.ruta_pkl is not None:
+                    try:
+                        self._pkl = cargar_modelo(self.ruta_pkl).modelo
+                    except Exception:
+                        # Sin sklearn o pickle ilegible: el .npmodel sirve igual
+                        logger.exception("No se pudo cargar %s; los lotes usan el .npmodel", self.ruta_pkl)
+                        self.ruta_pkl = None
+                        return self.modelo
+        return self._pkl
+
+    def info(self) -> dict:
+        return {
+            "nombre": self.nombre,
+            "version": self.version,
+            "ruta": str(self.ruta),
+            "formato": self.formato,
+            "mmap": self.mmap,
+            "segundos_carga": round(self.segundos_carga, 4),
+            "pkl_lotes": {"ruta": str(self.ruta_pkl), "desde_filas": self.filas_pkl,
+                          "cargado": self._pkl is not None} if self.ruta_pkl is not None else None,
+        }
+
+
+def cargar_modelo(ruta: Path, mmap: bool = True, filas_pkl: int = 0) -> ModeloCargado:
+    """Carga un .npmodel (solo NumPy) o un .pkl de joblib.
+
+    mmap solo se aplica a .npmodel, que se reescribe creando archivos nuevos
+    (los mapeos viejos siguen siendo válidos). Un .pkl se sobrescribe en el
+    mismo archivo y mapearlo rompería la recarga en caliente; además los
+    árboles de sklearn copian sus nodos al deserializarse de todos modos.
+    Con filas_pkl > 0, un .npmodel con .pkl al lado usa el .pkl en bloques
+    de filas_pkl filas o más (ver ModeloCargado.para_filas).
+    """
+    ruta = Path(ruta)
+    t0 = time.perf_counter()
+    ruta_pkl = None
+    if es_modelo_numpy(ruta):
+        modelo = cargar_modelo_numpy(ruta, mmap_mode="r" if mmap else None)
+        formato = "npmodel"
+        if filas_pkl > 0 and modelo.meta["tipo"] in TIPOS_PKL_LOTES and ruta.with_suffix(".pkl").is_file():
+            ruta_pkl = ruta.with_suffix(".pkl")
+    else:
+        import joblib  # solo hace falta para pickles
+
+        # Se ajustaron con DataFrame y aquí predicen sobre arreglos
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        modelo = joblib.load(ruta)
+        mmap = False
+        formato = "pkl"
+        # El paralelismo lo da el pool de inferencia (una predicción por
+        # hilo); si el bosque abre sus propios hilos se sobre-suscriben
+        # los núcleos.
+        if hasattr(modelo, "n_jobs"):
+            modelo.n_jobs = 1
+    segundos = time.perf_counter() - t0
+    return ModeloCargado(nombre_modelo(ruta), ruta, modelo, formato, segundos, mmap, ruta_pkl, filas_pkl)
+
+
+class RegistroModelos:
+    """Los modelos de ml/Modelos, cargados bajo demanda con caché LRU.
+
+    Descubre los artefactos "modelo_<nombre>_train90" (prefiere el .npmodel
+    al .pkl si existen ambos) y mantiene como máximo `max_cargados` en
+    memoria (el activo y los fijados con `fijar` nunca se desalojan); los
+    bloques de `filas_pkl` filas o más van al .pkl hermano del .npmodel
+    (0 = siempre el .npmodel). Si el
+    archivo de un modelo cambia en disco, la siguiente
+    petición carga la versión nueva y la reemplaza de forma atómica: las
+    predicciones en curso terminan con la versión anterior, que siguen
+    teniendo referenciada.
+
+    Con `archivo_activo`, activar() guarda ahí el nombre elegido y todos
+    los procesos que comparten el archivo (los workers de uvicorn) lo
+    adoptan al revisarlo, con un stat cada `revisar_cada` segundos. Al
+    arrancar, lo guardado manda sobre el `activo` de la configuración.
+    """
+
+    PATRON = "modelo_*_train90"
+
+    def __init__(self, directorio, activo: str, max_cargados: int = 3,
+                 mmap: bool = True, revisar_cada: float = 2.0, filas_pkl: int = 0,
+                 archivo_activo=None):
+        if max_cargados < 1:
+            raise ValueError("max_cargados debe ser >= 1")
+        self.directorio = Path(directorio)
+        self._activo = activo
+        self.archivo_activo = Path(archivo_activo) if archivo_activo else None
+        self._firma_activo = None
+        self._revisado_activo = float("-inf")
+        self.max_cargados = max_cargados
+        self.mmap = mmap
+        self.revisar_cada = revisar_cada
+        self.filas_pkl = filas_pkl
+        self._cargados = OrderedDict()  # nombre -> (ModeloCargado, firma, revisado_en)
+        self._firmas = {}     # nombre -> firma de la última versión cargada (aunque se haya desalojado)
+        self._revisados = {}  # nombre -> cuándo lo miró revisar() por última vez
+        self._usados = {}     # nombre -> último obtener() (orden del LRU)
+        self._lock = threading.Lock()
+        self._al_cambiar = []
+        self.fijados = set()
+
+    # ---------- descubrimiento ----------
+    def disponibles(self) -> dict:
+        rutas = {}
+        for ruta in sorted(self.directorio.glob(self.PATRON + ".*")):
+            nombre = nombre_modelo(ruta)
+            if ruta.suffix == ".npmodel" and es_modelo_numpy(ruta):
+                rutas[nombre] = ruta
+            elif ruta.suffix == ".pkl":
+                rutas.setdefault(nombre, ruta)
+        return rutas
+
+    @staticmethod
+    def _firma(ruta: Path):
+        # En un .npmodel el exportador escribe meta.json al final; el .pkl
+        # hermano también cuenta porque atiende los bloques grandes
+        st = (ruta / "meta.json" if ruta.is_dir() else ruta).stat()
+        pkl = ruta.with_suffix(".pkl")
+        st_pkl = pkl.stat() if ruta.is_dir() and pkl.is_file() else None
+        return (str(ruta), st.st_mtime_ns, st.st_size,
+                st_pkl and (st_pkl.st_mtime_ns, st_pkl.st_size))
+
+    # ---------- modelo activo compartido ----------
+    @property
+    def activo(self) -> str:
+        if self.archivo_activo is not None and time.monotonic() - self._revisado_activo >= self.revisar_cada:
+            self._leer_activo()
+        return self._activo
+
+    def _leer_activo(self):
+        self._revisado_activo = time.monotonic()
+        try:
+            st = self.archivo_activo.stat()
+            firma = (st.st_mtime_ns, st.st_size)
+            if firma == self._firma_activo:
+                return
+            nombre = self.archivo_activo.read_text(encoding="utf-8").strip()
+        except OSError:
+            return  # nadie activó nada todavía: vale el de la configuración
+        self._firma_activo = firma
+        if nombre == self._activo:
+            return
+        if nombre not in self.disponibles():
+            logger.warning("%s nombra un modelo no disponible (%s); se ignora", self.archivo_activo, nombre)
+            return
+        self._activo = nombre
+        self._notificar(nombre)
+
+    def _guardar_activo(self, nombre: str):
+        # Archivo temporal + os.replace: los demás procesos leen el nombre
+        # viejo o el nuevo, nunca uno a medio escribir
+        temporal = self.archivo_activo.with_name(f".{self.archivo_activo.name}.{os.getpid()}")
+        temporal.write_text(nombre + "\n", encoding="utf-8")
+        os.replace(temporal, self.archivo_activo)
+        st = self.archivo_activo.stat()
+        self._firma_activo = (st.st_mtime_ns, st.st_size)
+
+    # ---------- API ----------
+    @property
+    def listo(self) -> bool:
+        return self.activo in self._cargados
+
+    def al_cambiar(self, fn):
+        """Registra fn(nombre) que se llama cuando un modelo se recarga o
+        cambia el activo (p. ej. para invalidar cachés)."""
+        self._al_cambiar.append(fn)
+
+    def obtener(self, nombre: str = None) -> ModeloCargado:
+        nombre = nombre or self.activo
+        ahora = time.monotonic()
+        entrada = self._cargados.get(nombre)
+        # Sin el lock no se reordena _cargados (desalojar lo recorre); el
+        # uso queda en _usados y el desalojo ordena por ahí
+        self._usados[nombre] = ahora
+        if entrada is not None and ahora - entrada[2] < self.revisar_cada:
+            return entrada[0]
+
+        with self._lock:
+            rutas = self.disponibles()
+            if nombre not in rutas:
+                raise KeyError(f"Modelo no disponible: {nombre}")
+            firma = self._firma(rutas[nombre])
+
+            entrada = self._cargados.get(nombre)
+            if entrada is not None and entrada[1] == firma:
+                self._cargados[nombre] = (entrada[0], firma, ahora)
+                self._cargados.move_to_end(nombre)
+                return entrada[0]
+
+            try:
+                cargado = cargar_modelo(rutas[nombre], self.mmap, self.filas_pkl)
+            except Exception:
+                if entrada is None:
+                    raise
+                # Archivo a medio escribir o corrupto: seguir con el anterior
+                logger.exception("No se pudo recargar %s; se mantiene la versión anterior", nombre)
+                self._cargados[nombre] = (entrada[0], entrada[1], ahora)
+                return entrada[0]
+
+            self._cargados[nombre] = (cargado, firma, ahora)
+            self._cargados.move_to_end(nombre)
+            previa, self._firmas[nombre] = self._firmas.get(nombre), firma
+            # Desalojar el menos usado, pero nunca el activo ni los fijados
+            protegidos = {nombre, self.activo} | self.fijados
+            candidatos = [n for n in self._cargados if n not in protegidos]
+            for viejo in sorted(candidatos, key=lambda n: self._usados.get(n, float("-inf"))):
+                if len(self._cargados) <= self.max_cargados:
+                    break
+                del self._cargados[viejo]
+            print(f"✅ Modelo cargado: {cargado.ruta} ({cargado.segundos_carga:.3f}s)")
+
+        if previa is not None and previa != firma:
+            self._notificar(nombre)
+        return cargado
+
+    def revisar(self, nombre: str = None):
+        """Sin cargar nada: si el artefacto de `nombre` cambió en disco desde
+        la última carga, avisa ya a los suscriptores (al_cambiar) en vez de
+        esperar a la próxima carga, y fuerza a que obtener() lo recargue.
+        Cuesta un stat cada `revisar_cada` segundos; se puede llamar desde
+        el event loop."""
+        nombre = nombre or self.activo
+        firma = self._firmas.get(nombre)
+        ahora = time.monotonic()
+        if firma is None or ahora - self._revisados.get(nombre, float("-inf")) < self.revisar_cada:
+            return
+        self._revisados[nombre] = ahora
+        try:
+            actual = self._firma(Path(firma[0]))
+        except OSError:
+            actual = None  # borrado o reemplazado por otro formato
+        if actual == firma:
+            return
+        entrada = self._cargados.get(nombre)
+        if entrada is not None:
+            self._cargados[nombre] = (entrada[0], entrada[1], float("-inf"))
+        self._notificar(nombre)
+
+    def fijar(self, nombres):
+        """Modelos que quedan en memoria como el activo (p. ej. los miembros
+        del ensamble): el LRU no los desaloja aunque se pidan otros."""
+        faltan = [n for n in nombres if n not in self.disponibles()]
+        if faltan:
+            raise KeyError(f"Modelos no disponibles: {faltan}")
+        self.fijados.update(nombres)
+
+    def activar(self, nombre: str) -> ModeloCargado:
+        # Se carga ANTES de cambiar el activo: si falla, nada cambia
+        cargado = self.obtener(nombre)
+        if self.archivo_activo is not None:
+            self._guardar_activo(nombre)
+        if nombre != self._activo:
+            self._activo = nombre
+            self._notificar(nombre)
+        return cargado
+
+    def en_memoria(self, nombre: str = None):
+        """El ModeloCargado de `nombre` tal como está en memoria (None si no
+        está); no revisa el disco ni carga nada."""
+        entrada = self._cargados.get(nombre or self.activo)
+        return entrada[0] if entrada is not None else None
+
+    def version(self, nombre: str = None):
+        """Versión cargada de `nombre` (None si no está en memoria); no carga nada."""
+        cargado = self.en_memoria(nombre)
+        return cargado.version if cargado is not None else None
+
+    def info(self) -> dict:
+        return {
+            "activo": self.activo,
+            "disponibles": {n: str(r) for n, r in self.disponibles().items()},
+            "cargados": [c.info() for c, _, _ in list(self._cargados.values())],
+            "max_cargados": self.max_cargados,
+            "fijados": sorted(self.fijados),
+        }
+
+    def _notificar(self, nombre: str):
+        for fn in self._al_cambiar:
+            fn(nombre)
@@ -0,0 +1,205 @@
+# =========================
+# Modelos compilados a arreglos NumPy
+# =========================
+# Formato de artefacto: una carpeta "<modelo>.npmodel" con un meta.json que
+# describe el modelo y un .npy por arreglo. Se genera con
+# ml/exportar_modelos.py y para servir solo hace falta NumPy.
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+FORMATO = "anemia-npmodel"
+VERSION_FORMATO = 1
+
+# Filas por bloque al recorrer los árboles: acota la memoria temporal
+# (filas x árboles índices de nodo) en lotes grandes.
+FILAS_POR_BLOQUE = 256
+
+# exp de la libm (la misma que usa scipy.special.expit): np.exp usa SIMD y
+# difiere en el último bit en ~2% de los valores. La libm va elemento a
+# elemento desde Python, así que solo se usa hasta EXPIT_EXACTA_FILAS
+# valores (las peticiones individuales y sus micro-lotes); en lotes grandes
+# manda la velocidad y una diferencia de 1 ulp no cambia ningún resultado.
+_exp = np.frompyfunc(math.exp, 1, 1)
+EXPIT_EXACTA_FILAS = 64
+
+
+def expit(x: np.ndarray) -> np.ndarray:
+    """1 / (1 + exp(-x)); idéntica bit a bit a scipy.special.expit hasta
+    EXPIT_EXACTA_FILAS valores, vectorizada con np.exp por encima."""
+    if x.size > EXPIT_EXACTA_FILAS:
+        return 1.0 / (1.0 + np.exp(-x))
+    return 1.0 / (1.0 + _exp(-x).astype(np.float64))
+
+
+def recorrer(X: np.ndarray, raices, caracteristica, umbral, hijos, profundidad: int,
+             faltante_der=None) -> np.ndarray:
+    """Hoja de cada (fila, árbol) en nodos aplanados con índices globales.
+
+    Las hojas apuntan a sí mismas, así que `profundidad` pasos vectorizados
+    (filas x árboles) bastan para que terminen todos los recorridos. Con
+    `faltante_der`, un NaN va a la derecha donde el nodo lo indique (como
+    sklearn, que guarda el lado de los faltantes en cada nodo); si no,
+    x <= umbral es falso y va a la derecha.
+    """
+    # Índices planos en X: fila * n_features + característica del nodo
+    base = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+    plano = X.ravel()
+    hay_nan = faltante_der is not None and np.isnan(plano).any()
+    nodos = np.repeat(raices[None, :], X.shape[0], axis=0)
+    for _ in range(profundidad):
+        x = plano[base + caracteristica[nodos]]
+        va_der = ~(x <= umbral[nodos])
+        if hay_nan:
+            va_der = np.where(np.isnan(x), faltante_der[nodos], va_der)
+        # Hijos intercalados [izq0, der0, izq1, der1, ...]: un solo gather
+        # por nivel en vez de dos más un np.where
+        nodos = hijos[2 * nodos + va_der]
+    return nodos
+
+
+def _validar_X(X, n_features: int, dtype) -> np.ndarray:
+    X = np.ascontiguousarray(X, dtype=dtype)
+    if X.ndim != 2 or X.shape[1] != n_features:
+        raise ValueError(f"Se esperaban {n_features} columnas, llegó {X.shape}")
+    return X
+
+
+class BosqueCompilado:
+    """RandomForest aplanado: todos los nodos de todos los árboles en
+    arreglos contiguos, con índices globales.
+
+    Las hojas apuntan a sí mismas, así que basta con `profundidad` pasos
+    vectorizados (filas x árboles) para que todos los recorridos terminen.
+    predict_proba reproduce a sklearn bit a bit: X en float32 comparado con
+    umbrales float64, probabilidades de hoja ya normalizadas y suma de los
+    árboles en el mismo orden secuencial antes de dividir. Los NaN siguen el
+    lado de faltantes de cada nodo (`faltante_der`); un artefacto exportado
+    sin ese arreglo los rechaza en vez de mandarlos a la derecha.
+    """
+
+    def __init__(self, meta: dict, arreglos: dict):
+        self.meta = meta
+        self.classes_ = np.asarray(meta["clases"])
+        self.n_features_in_ = int(meta["n_features"])
+        self.profundidad = int(meta["profundidad"])
+        self.raices = arreglos["raices"]
+        self.caracteristica = arreglos["caracteristica"]
+        self.umbral = arreglos["umbral"]
+        self.valor = arreglos["valor"]
+        self.hijos = arreglos["hijos"]
+        self.faltante_der = arreglos.get("faltante_der")
+
+    def _hojas(self, X: np.ndarray) -> np.ndarray:
+        return recorrer(X, self.raices, self.caracteristica, self.umbral, self.hijos,
+                        self.profundidad, self.faltante_der)
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = _validar_X(X, self.n_features_in_, np.float32)
+        if self.faltante_der is None and np.isnan(X).any():
+            raise ValueError("Artefacto sin lado de faltantes: re-exportar para predecir con NaN")
+        salida = np.empty((X.shape[0], self.classes_.shape[0]), dtype=np.float64)
+        for i in range(0, X.shape[0], FILAS_POR_BLOQUE):
+            bloque = X[i:i + FILAS_POR_BLOQUE]
+            valores = self.valor[self._hojas(bloque)]  # filas x árboles x clases
+            # add.accumulate suma en orden (árbol 0, 1, 2, ...) como sklearn
+            salida[i:i + len(bloque)] = np.add.accumulate(valores, axis=1)[:, -1]
+        salida /= self.raices.shape[0]
+        return salida
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class GradienteCompilado:
+    """HistGradientBoosting binario: árboles de regresión aplanados (mismo
+    esquema que el bosque) cuyas hojas se suman a `base` en orden, como
+    _raw_predict, y expit da la probabilidad de la clase positiva.
+    """
+
+    def __init__(self, meta: dict, arreglos: dict):
+        self.meta = meta
+        self.classes_ = np.asarray(meta["clases"])
+        self.n_features_in_ = int(meta["n_features"])
+        self.profundidad = int(meta["profundidad"])
+        self.base = float(meta["base"])
+        self.raices = arreglos["raices"]
+        self.caracteristica = arreglos["caracteristica"]
+        self.umbral = arreglos["umbral"]
+        self.hijos = arreglos["hijos"]
+        self.valor = arreglos["valor"]
+        self.faltante_der = arreglos["faltante_der"]
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = _validar_X(X, self.n_features_in_, np.float64)
+        crudo = np.empty(X.shape[0], dtype=np.float64)
+        for i in range(0, X.shape[0], FILAS_POR_BLOQUE):
+            bloque = X[i:i + FILAS_POR_BLOQUE]
+            hojas = recorrer(bloque, self.raices, self.caracteristica, self.umbral, self.hijos,
+                             self.profundidad, self.faltante_der)
+            valores = np.empty((len(bloque), hojas.shape[1] + 1))
+            valores[:, 0] = self.base
+            valores[:, 1:] = self.valor[hojas]
+            crudo[i:i + len(bloque)] = np.add.accumulate(valores, axis=1)[:, -1]
+        salida = np.empty((X.shape[0], 2), dtype=np.float64)
+        salida[:, 1] = expit(crudo)
+        salida[:, 0] = 1 - salida[:, 1]
+        return salida
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class LinealCompilado:
+    """StandardScaler + LogisticRegression binaria: (X - media) / escala,
+    producto con los coeficientes y expit, en el mismo orden que sklearn."""
+
+    def __init__(self, meta: dict, arreglos: dict):
+        self.meta = meta
+        self.classes_ = np.asarray(meta["clases"])
+        self.n_features_in_ = int(meta["n_features"])
+        self.media = arreglos["media"]
+        self.escala = arreglos["escala"]
+        self.coef = arreglos["coef"]            # (1, n_features)
+        self.intercepto = arreglos["intercepto"]  # (1,)
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = _validar_X(X, self.n_features_in_, np.float64)
+        X = (X - self.media) / self.escala
+        z = (X @ self.coef.T + self.intercepto).ravel()
+        salida = np.empty((X.shape[0], 2), dtype=np.float64)
+        salida[:, 1] = expit(z)
+        salida[:, 0] = 1 - salida[:, 1]
+        return salida
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+TIPOS = {
+    "bosque": BosqueCompilado,
+    # Un DecisionTree es un bosque de un árbol (dividir por 1 es exacto)
+    "arbol": BosqueCompilado,
+    "gradiente": GradienteCompilado,
+    "lineal": LinealCompilado,
+}
+
+
+def es_modelo_numpy(ruta) -> bool:
+    return (Path(ruta) / "meta.json").is_file()
+
+
+def cargar_modelo_numpy(ruta, mmap_mode=None):
+    """Con mmap_mode="r" los arreglos se mapean desde disco (sin copiarlos):
+    varios procesos que sirven el mismo artefacto comparten esas páginas."""
+    ruta = Path(ruta)
+    meta = json.loads((ruta / "meta.json").read_text(encoding="utf-8"))
+    if meta.get("formato") != FORMATO or meta.get("version") != VERSION_FORMATO:
+        raise ValueError(f"Artefacto no reconocido en {ruta}: {meta.get('formato')} v{meta.get('version')}")
+    if meta["tipo"] not in TIPOS:
+        raise ValueError(f"Tipo de modelo no soportado: {meta['tipo']}")
+
+    arreglos = {nombre: np.load(ruta / f"{nombre}.npy", mmap_mode=mmap_mode) for nombre in meta["arreglos"]}
+    return TIPOS[meta["tipo"]](meta, arreglos)
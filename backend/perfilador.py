@@ -0,0 +1,99 @@
+# =========================
+# Perfilador por muestreo
+# =========================
+# Un hilo toma cada `intervalo_ms` la pila de TODOS los hilos
+# (sys._current_frames) y cuenta cuántas veces aparece cada pila. No
+# instrumenta el código: apagado no cuesta nada y encendido cuesta una
+# muestra por intervalo, así que se puede prender en producción un rato y
+# ver dónde se va el tiempo. El reporte es texto "pila colapsada"
+# (func_a;func_b;func_c N), el que leen flamegraph.pl y speedscope.
+# Los marcos van por función (sin número de línea) y hay a lo sumo
+# `max_pilas_distintas` pilas; las que llegan después suman en OTRAS, así
+# que encendido mucho tiempo la memoria no crece sin límite.
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+OTRAS = "(otras pilas)"
+
+
+class PerfiladorMuestreo:
+    def __init__(self, intervalo_ms: float = 10.0, max_profundidad: int = 64,
+                 max_pilas_distintas: int = 10_000):
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_profundidad = max_profundidad
+        self.max_pilas_distintas = max_pilas_distintas
+        self.muestras = 0
+        self.desde = None
+        self._pilas = Counter()
+        self._hilo = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, intervalo_ms: float = None, reiniciar: bool = True):
+        if intervalo_ms:
+            self.intervalo = intervalo_ms / 1000.0
+        if self.activo:
+            return
+        if reiniciar:
+            with self._lock:
+                self._pilas.clear()
+                self.muestras = 0
+        self.desde = time.time()
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="perfilador", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._parar.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def _pila(self, frame) -> str:
+        partes = []
+        while frame is not None and len(partes) < self.max_profundidad:
+            codigo = frame.f_code
+            partes.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(partes))
+
+    def _bucle(self):
+        propio = threading.get_ident()
+        nombres = {}
+        while not self._parar.wait(self.intervalo):
+            if len(nombres) != threading.active_count():
+                nombres = {h.ident: h.name for h in threading.enumerate()}
+            pilas = [
+                f"{nombres.get(ident, ident)};{self._pila(frame)}"
+                for ident, frame in sys._current_frames().items()
+                if ident != propio
+            ]
+            with self._lock:
+                for pila in pilas:
+                    if pila not in self._pilas and len(self._pilas) >= self.max_pilas_distintas:
+                        pila = OTRAS
+                    self._pilas[pila] += 1
+                self.muestras += 1
+
+    def reporte(self, max_pilas: int = 0) -> str:
+        """Pilas colapsadas, de la más frecuente a la menos (0 = todas)."""
+        with self._lock:
+            pilas = self._pilas.most_common(max_pilas or None)
+        return "".join(f"{pila} {n}\n" for pila, n in pilas)
+
+    def estado(self) -> dict:
+        return {
+            "activo": self.activo,
+            "intervalo_ms": self.intervalo * 1000.0,
+            "muestras": self.muestras,
+            "pilas_distintas": len(self._pilas),
+            "max_pilas_distintas": self.max_pilas_distintas,
+            "desde": self.desde,
+        }
@@ -1,13 +1,32 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Literal
+from typing import List, Literal, Optional
 from pathlib import Path
 import os
+import io
+import hmac
+import asyncio
+import tempfile
+from collections import deque
 import logging
-import joblib
 import numpy as np
+import orjson
+
+from modelos import RegistroModelos
+from inferencia import predecir, PoolInferencia, SaturacionInferencia
+from microlotes import MicroLotes
+from cache import CachePredicciones
+from clinica import NIVELES, procesar_genero, severidad_hb, severidad_codigos
+import formatos
+from lotes import LectorCSV, encabezado_salida, formatear_bloque, puntuar_bloque
+from metricas import Medidor, MiddlewareMetricas, etapa, instrumentado, metricas, predicciones
+from perfilador import PerfiladorMuestreo
+from auditoria import Auditoria, DestinoMongo, DestinoSQLite
+from deriva import MonitorDeriva, leer_perfil
+from ensamble import NOMBRE as NOMBRE_ENSAMBLE, Ensamble, leer_calibracion
 
 
 # =========================
@@ -25,15 +44,277 @@ api_router = APIRouter(prefix="/api")
 
 
 # =========================
-# Cargar Modelo Entrenado
+# Modelos Entrenados (registro, carga perezosa)
 # =========================
-MODEL_PATH = ROOT_DIR.parent / "ml" / "Modelos" / "modelo_randomforest_train90.pkl"
+MODELS_DIR = ROOT_DIR.parent / "ml" / "Modelos"
+
+# Todos los modelo_*_train90 de ml/Modelos están disponibles; MODELO_ACTIVO
+# es el que se usa por defecto. Si existe la versión compilada (.npmodel,
+# ver ml/exportar_modelos.py) se prefiere al .pkl.
+# Nada se carga al importar: el activo arranca en segundo plano en el
+# startup y, si llega una petición antes, la primera predicción espera.
+# Con MODELO_MMAP=1 los arreglos se mapean desde disco y los workers de
+# uvicorn comparten esas páginas (un solo modelo en RAM para N workers).
+# Si un artefacto cambia en disco se recarga solo, sin reiniciar la API.
+# Los bloques de LOTE_FILAS_PKL filas o más (archivos, lotes grandes) van
+# al .pkl de sklearn, más rápido que el .npmodel a partir de ~512 filas.
+# El modelo elegido con PUT /api/modelos/activo se guarda en
+# MODELO_ACTIVO_ARCHIVO: así lo adoptan todos los workers (y los reinicios),
+# no solo el que recibió la petición.
+registro = RegistroModelos(
+    MODELS_DIR,
+    activo=os.environ.get("MODELO_ACTIVO") or "randomforest",
+    max_cargados=int(os.environ.get("MODELOS_MAX_CARGADOS") or 3),
+    mmap=os.environ.get("MODELO_MMAP", "1") != "0",
+    filas_pkl=int(os.environ.get("LOTE_FILAS_PKL") or 512),
+    archivo_activo=os.environ.get("MODELO_ACTIVO_ARCHIVO") or MODELS_DIR / "modelo_activo.txt",
+)
+
+# Token para las rutas de administración (vacío = rutas deshabilitadas)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Umbral de decisión sobre prob_anemia. Para tamizaje conviene bajarlo
+# (más recall a costa de precisión); 0.5 equivale a model.predict.
+UMBRAL_ANEMIA = float(os.environ.get("UMBRAL_ANEMIA", "0.5"))
+if not 0.0 <= UMBRAL_ANEMIA <= 1.0:
+    raise RuntimeError(f"❌ UMBRAL_ANEMIA debe estar entre 0 y 1 (recibido {UMBRAL_ANEMIA})")
+
+
+# =========================
+# Pool de Inferencia
+# =========================
+# La predicción es bloqueante: se ejecuta en hilos aparte para no frenar
+# el event loop. Si se llena el pool + cola, se responde 503.
+INFERENCIA_WORKERS = int(os.environ.get("INFERENCIA_WORKERS") or os.cpu_count() or 1)
+INFERENCIA_COLA = int(os.environ.get("INFERENCIA_COLA") or 64)
+
+pool_inferencia = PoolInferencia(INFERENCIA_WORKERS, INFERENCIA_COLA)
+
+
+# =========================
+# Ensamble (opcional)
+# =========================
+# Con ENSAMBLE_MODELOS, las peticiones sin ?modelo= usan el promedio de
+# esos modelos con sus probabilidades calibradas (ml/calibracion.py), todos
+# sobre la misma matriz y en paralelo. Las peticiones individuales tienen
+# un presupuesto (ENSAMBLE_PRESUPUESTO_MS): si un miembro no llega, la
+# respuesta lo nombra en el header X-Ensamble-Omitidos y no se guarda en
+# caché. Lotes y archivos esperan siempre a todos los miembros.
+# ?modelo=<nombre> sigue pidiendo un modelo solo.
+def crear_ensamble() -> Optional[Ensamble]:
+    miembros = [n.strip() for n in (os.environ.get("ENSAMBLE_MODELOS") or "").split(",") if n.strip()]
+    if not miembros:
+        return None
+    faltan = [n for n in miembros if n not in registro.disponibles()]
+    if faltan:
+        raise RuntimeError(f"❌ ENSAMBLE_MODELOS: modelos no disponibles en {MODELS_DIR}: {faltan}")
+    pesos = [float(p) for p in (os.environ.get("ENSAMBLE_PESOS") or "").split(",") if p.strip()]
+    # Los miembros quedan fijos en memoria como el activo: un ?modelo=otro no
+    # los desaloja (si no, /api/listo volvería a 503 y el miembro recargado
+    # quedaría fuera del presupuesto). El LRU tiene que alcanzar para todos.
+    registro.fijar(miembros)
+    necesarios = len(set(miembros) | {registro.activo})
+    if registro.max_cargados < necesarios:
+        print(f"⚠️ MODELOS_MAX_CARGADOS={registro.max_cargados} no alcanza para el ensamble: se usa {necesarios}")
+        registro.max_cargados = necesarios
+    calibracion = None
+    if os.environ.get("ENSAMBLE_CALIBRAR", "1") != "0":
+        calibracion = leer_calibracion(os.environ.get("CALIBRACION") or MODELS_DIR / "calibracion.json")
+    return Ensamble(
+        registro, miembros, pesos or None, calibracion,
+        presupuesto_ms=float(os.environ.get("ENSAMBLE_PRESUPUESTO_MS") or 50),
+        hilos=INFERENCIA_WORKERS,
+    )
+
+
+ensamble = crear_ensamble()
+
+
+def usa_ensamble(nombre: Optional[str]) -> bool:
+    return ensamble is not None and nombre in (None, NOMBRE_ENSAMBLE)
+
+
+def resolver(nombre: Optional[str] = None):
+    """Lo que atiende la petición: el ensamble o un ModeloCargado (ambos con .modelo y .version)."""
+    return ensamble if usa_ensamble(nombre) else registro.obtener(nombre)
+
+
+def version_de(nombre: Optional[str] = None) -> Optional[str]:
+    # No carga nada (None si el modelo todavía no está en memoria)
+    return ensamble.version if usa_ensamble(nombre) else registro.version(nombre)
+
+
+def predecir_modelo(arr: np.ndarray, nombre: Optional[str] = None, completo: bool = False):
+    # Corre en un hilo del pool: si el modelo aún no está, se carga aquí.
+    # Devuelve (tiene, prob, omitidos); omitidos = miembros del ensamble que
+    # quedaron fuera por el presupuesto (nunca con completo=True)
+    if usa_ensamble(nombre):
+        prob, omitidos = ensamble.evaluar(arr, presupuesto=not completo)
+        return prob > UMBRAL_ANEMIA, prob, omitidos
+    # Los micro-lotes quedan en el .npmodel; un /lote grande va al .pkl
+    modelo = registro.obtener(nombre).para_filas(len(arr))
+    return (*predecir(modelo, arr, UMBRAL_ANEMIA), ())
+
+
+# Las peticiones individuales que llegan dentro de la ventana se juntan en
+# una sola llamada al modelo. MICROLOTE_VENTANA_MS=0 desactiva la espera.
+microlotes = MicroLotes(
+    pool_inferencia,
+    predecir_modelo,
+    ventana_ms=float(os.environ.get("MICROLOTE_VENTANA_MS") or 2),
+    max_filas=int(os.environ.get("MICROLOTE_MAX_FILAS") or 64),
+    max_cola=int(os.environ.get("MICROLOTE_MAX_COLA") or 1024),
+)
+
+
+async def inferir(arr: np.ndarray, nombre: Optional[str] = None, completo: bool = False):
+    try:
+        return await pool_inferencia.ejecutar(predecir_modelo, arr, nombre, completo)
+    except SaturacionInferencia as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        raise RuntimeError(f"Error al predecir: {e}")
+
+
+async def inferir_fila(fila: np.ndarray, nombre: Optional[str] = None):
+    try:
+        return await microlotes.predecir(fila, nombre)
+    except SaturacionInferencia as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        raise RuntimeError(f"Error al predecir: {e}")
+
+
+# =========================
+# Caché de Predicciones
+# =========================
+# Misma entrada + mismo modelo = misma probabilidad: un acierto no toca el
+# modelo. Se vacía cuando un modelo se recarga o cambia el activo, y antes
+# de usar un acierto se revisa que el artefacto no haya cambiado en disco.
+CACHE_DECIMALES = 1
+cache_predicciones = CachePredicciones(
+    max_entradas=int(os.environ.get("CACHE_MAX_ENTRADAS") or 10000),
+    ttl_s=float(os.environ.get("CACHE_TTL_S") or 300),
+)
+registro.al_cambiar(cache_predicciones.invalidar)
+
+
+def revisar_vigencia(nombre: Optional[str]):
+    # Un modelo recargado en disco invalida la caché ya, no recién en el
+    # próximo fallo (un stat por modelo cada revisar_cada segundos)
+    for n in ensamble.miembros if usa_ensamble(nombre) else (nombre,):
+        registro.revisar(n)
+
+
+# =========================
+# Auditoría de predicciones
+# =========================
+# Cada predicción se registra en segundo plano y en lotes: en MongoDB si hay
+# MONGO_URL, si no en un SQLite local. AUDITORIA=0 la desactiva.
+def crear_auditoria() -> Optional[Auditoria]:
+    if os.environ.get("AUDITORIA", "1") == "0":
+        return None
+    mongo_url = os.environ.get("MONGO_URL")
+    if mongo_url:
+        destino = DestinoMongo(
+            mongo_url,
+            os.environ.get("DB_NAME") or "anemia_db",
+            os.environ.get("AUDITORIA_COLECCION") or "predicciones",
+            max_conexiones=int(os.environ.get("AUDITORIA_MAX_CONEXIONES") or 4),
+        )
+    else:
+        destino = DestinoSQLite(os.environ.get("AUDITORIA_SQLITE") or ROOT_DIR / "auditoria.sqlite3")
+    return Auditoria(
+        destino,
+        lote_max=int(os.environ.get("AUDITORIA_LOTE_MAX") or 1000),
+        intervalo_ms=float(os.environ.get("AUDITORIA_INTERVALO_MS") or 500),
+        max_pendientes=int(os.environ.get("AUDITORIA_MAX_PENDIENTES") or 100_000),
+    )
+
+
+auditoria = crear_auditoria()
+
+
+# =========================
+# Monitor de deriva
+# =========================
+# Entradas y prob_anemia en producción vs. el perfil de entrenamiento que
+# escribe ml/entrenamiento.py (PSI y KS por variable en /api/deriva).
+# DERIVA=0 lo desactiva; sin perfil solo reporta las estadísticas.
+monitor_deriva = None
+if os.environ.get("DERIVA", "1") != "0":
+    monitor_deriva = MonitorDeriva(
+        leer_perfil(os.environ.get("DERIVA_PERFIL") or MODELS_DIR / "perfil_referencia.json"),
+        bloque=int(os.environ.get("DERIVA_BLOQUE") or 1024),
+        min_filas=int(os.environ.get("DERIVA_MIN_FILAS") or 100),
+    )
 
-try:
-    model = joblib.load(MODEL_PATH)
-    print(f"✅ Modelo cargado: {MODEL_PATH}")
-except Exception as e:
-    raise RuntimeError(f"❌ ERROR cargando el modelo en: {MODEL_PATH}\n{e}")
+
+# =========================
+# Métricas (/metrics) y perfilador
+# =========================
+# Los medidores se leen al momento de exportar
+metricas.agregar(Medidor(
+    "anemia_microlotes_en_cola", "Filas esperando en la cola de micro-lotes",
+    lambda: microlotes.en_cola))
+metricas.agregar(Medidor(
+    "anemia_inferencia_en_curso", "Trabajos en el pool de inferencia (ejecutando + en espera)",
+    lambda: pool_inferencia.en_curso))
+metricas.agregar(Medidor(
+    "anemia_inferencia_capacidad", "Trabajos admitidos en el pool antes de responder 503",
+    lambda: pool_inferencia.capacidad))
+metricas.agregar(Medidor(
+    "anemia_modelo_carga_segundos", "Tiempo de carga de cada modelo en memoria",
+    lambda: {(c["nombre"], c["version"], c["formato"]): c["segundos_carga"]
+             for c in registro.info()["cargados"]},
+    etiquetas=("modelo", "version", "formato")))
+metricas.agregar(Medidor(
+    "anemia_cache_aciertos_total", "Aciertos de la caché de predicciones",
+    lambda: cache_predicciones.aciertos, tipo="counter"))
+metricas.agregar(Medidor(
+    "anemia_cache_fallos_total", "Fallos de la caché de predicciones",
+    lambda: cache_predicciones.fallos, tipo="counter"))
+if ensamble is not None:
+    metricas.agregar(Medidor(
+        "anemia_ensamble_omitidos_total", "Miembros del ensamble que no llegaron dentro del presupuesto",
+        lambda: {(n,): v for n, v in ensamble.omitidos.items()}, etiquetas=("modelo",), tipo="counter"))
+    metricas.agregar(Medidor(
+        "anemia_ensamble_parciales_total", "Llamadas al ensamble que respondieron sin algún miembro",
+        lambda: ensamble.parciales, tipo="counter"))
+if auditoria is not None:
+    metricas.agregar(Medidor(
+        "anemia_auditoria_pendientes", "Predicciones en cola esperando ser escritas",
+        lambda: auditoria.pendientes))
+    metricas.agregar(Medidor(
+        "anemia_auditoria_escritas_total", "Predicciones escritas en el registro de auditoría",
+        lambda: auditoria.escritas, tipo="counter"))
+    metricas.agregar(Medidor(
+        "anemia_auditoria_descartadas_total", "Predicciones descartadas por cola llena",
+        lambda: auditoria.descartadas, tipo="counter"))
+    metricas.agregar(Medidor(
+        "anemia_auditoria_errores_total", "Lotes que el destino de auditoría rechazó",
+        lambda: auditoria.errores, tipo="counter"))
+if monitor_deriva is not None:
+    metricas.agregar(Medidor(
+        "anemia_deriva_psi", "PSI de cada entrada (y de prob_anemia por modelo) vs. el entrenamiento",
+        monitor_deriva.psi_por_serie, etiquetas=("variable", "modelo")))
+
+
+def contar_predicciones(codigos, version: Optional[str]):
+    for codigo, n in enumerate(np.bincount(np.asarray(codigos, dtype=np.intp), minlength=len(NIVELES))):
+        if n:
+            predicciones.inc(NIVELES[codigo], version or "desconocida", cantidad=int(n))
+
+
+# Apagado por defecto; se prende en caliente con PUT /api/perfilador
+perfilador = PerfiladorMuestreo(
+    float(os.environ.get("PERFILADOR_INTERVALO_MS") or 10),
+    max_pilas_distintas=int(os.environ.get("PERFILADOR_MAX_PILAS") or 10_000),
+)
 
 
 # =========================
@@ -58,37 +339,15 @@ class AnemiaResult(BaseModel):
 # =========================
 # Funciones Lógicas
 # =========================
-def procesar_genero(g: str) -> int:
-    return 1 if g.lower() == "masculino" else 0
-
-
-def severidad_hb(genero: str, hb: float) -> str:
-    # WHO simplified
-    if genero == "masculino":
-        if hb >= 13: return "sin_anemia"
-        if hb >= 11: return "leve"
-        if hb >= 8: return "moderada"
-        return "severa"
-    else:
-        if hb >= 12: return "sin_anemia"
-        if hb >= 11: return "leve"
-        if hb >= 8: return "moderada"
-        return "severa"
-
-
-def recomendaciones_por_severidad(s: str):
-    base = [
-        "Mantén una dieta rica en hierro (carnes rojas, espinaca, lentejas).",
-        "Consume vitamina C para absorber hierro (naranja, kiwi).",
-        "Evita té/café junto a comidas con hierro."
-    ]
-    if s == "leve": 
-        return base + ["Control médico recomendado."]
-    if s == "moderada":
-        return base + ["Consulta con un profesional de salud cuanto antes."]
-    if s == "severa":
-        return base + ["Acude a un centro médico urgentemente."]
-    return ["Niveles saludables. Mantén una buena alimentación."]
+def clave_cache(datos: AnemiaAnalysisInput, modelo: Optional[str]):
+    # Solo se cachean valores con a lo sumo CACHE_DECIMALES decimales (como
+    # los reporta el laboratorio): así un acierto devuelve exactamente lo
+    # mismo que habría dado el modelo. Con más precisión, se predice.
+    valores = (datos.hemoglobina, datos.mch, datos.mchc, datos.mcv)
+    if any(round(v, CACHE_DECIMALES) != v for v in valores):
+        return None
+    nombre = NOMBRE_ENSAMBLE if usa_ensamble(modelo) else (modelo or registro.activo)
+    return (nombre, procesar_genero(datos.genero), *valores)
 
 
 # =========================
@@ -99,38 +358,369 @@ async def root():
     return {"message": "Sistema de anemia funcionando ✅"}
 
 
-@api_router.post("/analizar-anemia", response_model=AnemiaResult)
-async def analizar_anemia(datos: AnemiaAnalysisInput):
+def construir_matriz(pacientes: List[AnemiaAnalysisInput]) -> np.ndarray:
+    # Una fila por paciente, con el mismo ORDEN de columnas del entrenamiento
+    return np.array(
+        [[procesar_genero(d.genero), d.hemoglobina, d.mch, d.mchc, d.mcv] for d in pacientes],
+        dtype=float,
+    ).reshape(-1, 5)
+
+
+def codigo_severidad(datos: AnemiaAnalysisInput) -> int:
+    return NIVELES.index(severidad_hb(datos.genero, datos.hemoglobina))
+
+
+@api_router.get("/listo")
+async def listo():
+    # Readiness: 503 hasta que el modelo activo (y el ensamble) esté cargado.
+    # Solo mira lo que ya está en memoria: nada de revisar el disco ni
+    # recargar desde el event loop (eso lo hace la próxima predicción).
+    cargado = registro.en_memoria()
+    if cargado is None or (ensamble is not None and None in map(registro.version, ensamble.miembros)):
+        raise HTTPException(status_code=503, detail="Modelo cargando")
+    respuesta = {"listo": True, "modelo": cargado.info()}
+    if ensamble is not None:
+        respuesta["ensamble"] = ensamble.version
+    return respuesta
+
+
+class ActivarModeloInput(BaseModel):
+    nombre: str
+
+
+def verificar_admin(token: Optional[str]):
+    # Cerrado por defecto: sin ADMIN_TOKEN configurado nadie administra
+    # (la API acepta cualquier origen CORS)
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Rutas de administración deshabilitadas (sin ADMIN_TOKEN)")
+    # Comparación en tiempo constante
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+
+@api_router.get("/modelos")
+async def listar_modelos():
+    info = registro.info()
+    if ensamble is not None:
+        info["ensamble"] = {"version": ensamble.version, **ensamble.info()}
+    return info
+
+
+@api_router.put("/modelos/activo")
+async def activar_modelo(datos: ActivarModeloInput, x_admin_token: Optional[str] = Header(None)):
+    verificar_admin(x_admin_token)
+    if ensamble is not None:
+        # Con ENSAMBLE_MODELOS las peticiones sin ?modelo= van al ensamble:
+        # cambiar el activo no cambiaría lo que se sirve
+        raise HTTPException(
+            status_code=409,
+            detail=f"El ensamble ({', '.join(ensamble.miembros)}) atiende las peticiones por defecto; "
+                   f"el modelo activo no se usa (quitar ENSAMBLE_MODELOS para elegirlo)",
+        )
+    try:
+        # La carga es bloqueante: fuera del event loop
+        cargado = await asyncio.get_running_loop().run_in_executor(None, registro.activar, datos.nombre)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"activo": registro.activo, "modelo": cargado.info()}
 
-    genero_num = procesar_genero(datos.genero)
 
-    # INPUT AL MODELO — el mismo ORDEN del entrenamiento
-    arr = np.array([[genero_num, datos.hemoglobina, datos.mch, datos.mchc, datos.mcv]])
+class PerfiladorInput(BaseModel):
+    activo: bool
+    intervalo_ms: Optional[float] = None
 
-    try:
-        pred = int(model.predict(arr)[0])  # 0 = sin anemia, 1 = con anemia
-        prob = float(model.predict_proba(arr)[0][1])
-    except Exception as e:
-        raise RuntimeError(f"Error al predecir: {e}")
 
-    tiene = pred == 1
-    severidad = severidad_hb(datos.genero, datos.hemoglobina)
+@api_router.get("/perfilador")
+async def reporte_perfilador(max_pilas: int = 200, x_admin_token: Optional[str] = Header(None)):
+    # Pilas colapsadas (flamegraph.pl / speedscope)
+    verificar_admin(x_admin_token)
+    return PlainTextResponse(perfilador.reporte(max_pilas))
 
-    mensaje = (
-        "El modelo sugiere presencia de anemia." if tiene
-        else "No hay indicios de anemia según el modelo."
-    )
 
-    recs = recomendaciones_por_severidad(severidad)
+@api_router.put("/perfilador")
+async def configurar_perfilador(datos: PerfiladorInput, x_admin_token: Optional[str] = Header(None)):
+    verificar_admin(x_admin_token)
+    if datos.activo:
+        perfilador.iniciar(datos.intervalo_ms)
+    else:
+        await asyncio.get_running_loop().run_in_executor(None, perfilador.detener)
+    return perfilador.estado()
+
+
+@api_router.get("/deriva")
+async def deriva():
+    if monitor_deriva is None:
+        raise HTTPException(status_code=404, detail="Monitor de deriva desactivado (DERIVA=0)")
+    return monitor_deriva.reporte()
+
+
+@api_router.delete("/deriva")
+async def reiniciar_deriva(x_admin_token: Optional[str] = Header(None)):
+    # Empezar una ventana nueva (p. ej. después de reentrenar)
+    verificar_admin(x_admin_token)
+    if monitor_deriva is None:
+        raise HTTPException(status_code=404, detail="Monitor de deriva desactivado (DERIVA=0)")
+    monitor_deriva.reiniciar()
+    return {"reiniciado": True}
 
-    return AnemiaResult(
-        tiene_anemia=tiene,
-        nivel_severidad=severidad,
-        prob_anemia=round(prob, 4),
-        mensaje=mensaje,
-        recomendaciones=recs,
-        valores_ingresados=datos.dict()
-    )
+
+@api_router.get("/inferencia/metricas")
+async def metricas_inferencia():
+    return {
+        "microlotes": microlotes.metricas(),
+        "cache": cache_predicciones.metricas(),
+        "pool": {
+            "workers": pool_inferencia.workers,
+            "capacidad": pool_inferencia.capacidad,
+            "en_curso": pool_inferencia.en_curso,
+        },
+    }
+
+
+@api_router.get("/codigos")
+async def codigos():
+    # Tablas para traducir las respuestas compactas (severidad = código)
+    return formatos.codigos()
+
+
+# Ambas rutas negocian el formato con el header Accept (ver formatos.py):
+# sin Accept o con application/json responden lo de siempre (AnemiaResult).
+@api_router.post("/analizar-anemia", response_model=AnemiaResult)
+@instrumentado
+async def analizar_anemia(datos: AnemiaAnalysisInput, modelo: Optional[str] = None,
+                          accept: Optional[str] = Header(None)):
+    formato = formatos.negociar(accept)
+
+    clave = clave_cache(datos, modelo)
+    if clave:
+        revisar_vigencia(modelo)
+    prob = cache_predicciones.obtener(clave) if clave else None
+    omitidos = ()
+    if prob is not None:
+        tiene = prob > UMBRAL_ANEMIA
+    else:
+        # INPUT AL MODELO — el mismo ORDEN del entrenamiento
+        with etapa("caracteristicas"):
+            arr = construir_matriz([datos])
+
+        generacion = cache_predicciones.generacion
+        with etapa("inferencia"):
+            tiene, prob, omitidos = await inferir_fila(arr[0], modelo)
+        # Un resultado parcial del ensamble no se cachea: el siguiente
+        # pedido igual puede tener todos los miembros
+        if clave and not omitidos:
+            cache_predicciones.guardar(clave, prob, generacion)
+
+    codigo = codigo_severidad(datos)
+    version = version_de(modelo)
+    predicciones.inc(NIVELES[codigo], version or "desconocida")
+    if auditoria is not None:
+        # En la auditoría queda qué miembros faltaron en esta respuesta
+        auditada = f"{version or 'desconocida'} sin {','.join(omitidos)}" if omitidos else version
+        auditoria.registrar("individual", auditada, (datos,), (tiene,), (prob,), (codigo,))
+    if monitor_deriva is not None:
+        fila = (procesar_genero(datos.genero), datos.hemoglobina, datos.mch, datos.mchc, datos.mcv)
+        monitor_deriva.observar(fila, (prob,), version or "desconocida")
+    with etapa("serializacion"):
+        respuesta = formatos.responder(formato, datos.model_dump(), tiene, prob, codigo)
+    if omitidos:
+        respuesta.headers["X-Ensamble-Omitidos"] = ",".join(omitidos)
+    return respuesta
+
+
+@api_router.post("/analizar-anemia/lote", response_model=List[AnemiaResult])
+@instrumentado
+async def analizar_anemia_lote(pacientes: List[AnemiaAnalysisInput], modelo: Optional[str] = None,
+                               accept: Optional[str] = Header(None)):
+    # Varios pacientes (p. ej. un turno completo del laboratorio) en UNA sola
+    # llamada al modelo: se evita pagar el costo fijo de sklearn por cada fila.
+    formato = formatos.negociar(accept)
+    if not pacientes:
+        return formatos.responder_lote(formato, [], [], [], [])
+
+    with etapa("caracteristicas"):
+        arr = construir_matriz(pacientes)
+        codigos = severidad_codigos(arr[:, 0], arr[:, 1])
+
+    claves = [clave_cache(d, modelo) for d in pacientes]
+    revisar_vigencia(modelo)
+    probs = [cache_predicciones.obtener(c) if c else None for c in claves]
+
+    # Solo las filas que no estaban en caché van al modelo (en una llamada)
+    faltan = [i for i, p in enumerate(probs) if p is None]
+    if faltan:
+        generacion = cache_predicciones.generacion
+        with etapa("inferencia"):
+            # Sin presupuesto: un lote espera a todos los miembros del ensamble
+            _, prob, _ = await inferir(arr[faltan], modelo, completo=True)
+        for i, p in zip(faltan, prob):
+            probs[i] = float(p)
+            if claves[i]:
+                cache_predicciones.guardar(claves[i], probs[i], generacion)
+
+    version = version_de(modelo)
+    contar_predicciones(codigos, version)
+    probs = np.asarray(probs, dtype=float)
+    if auditoria is not None:
+        auditoria.registrar("lote", version, pacientes, probs > UMBRAL_ANEMIA, probs, codigos)
+    if monitor_deriva is not None:
+        monitor_deriva.observar(arr, probs, version or "desconocida")
+    with etapa("serializacion"):
+        # El JSON completo repite los valores ingresados; los formatos
+        # compactos no los usan
+        datos = [d.model_dump() for d in pacientes] if formato == formatos.JSON else None
+        return formatos.responder_lote(formato, datos, probs > UMBRAL_ANEMIA, probs, codigos)
+
+
+def puntuar_y_formatear(X: np.ndarray, nombre: Optional[str], formato: str, sep: str) -> str:
+    # Corre en un hilo del pool: inferencia + severidad + texto de salida.
+    # El ensamble va sin presupuesto: todos los bloques con todos los miembros
+    cargado = resolver(nombre)
+    modelo = ensamble.completo if cargado is ensamble else cargado.para_filas(len(X))
+    resultado = puntuar_bloque(modelo, X, UMBRAL_ANEMIA)
+    contar_predicciones(resultado[3], cargado.version)
+    return formatear_bloque(resultado, formato, sep)
+
+
+async def inferir_bloque(X: np.ndarray, nombre: Optional[str], formato: str, sep: str) -> str:
+    # Primer bloque de un archivo: todavía se puede responder con un error
+    try:
+        return await pool_inferencia.ejecutar(puntuar_y_formatear, X, nombre, formato, sep)
+    except SaturacionInferencia as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+
+# Un archivo ya empezado no puede responder 503: si el pool está lleno por
+# otras peticiones, cada bloque espera su lugar hasta ARCHIVO_ESPERA_S
+ARCHIVO_ESPERA_S = float(os.environ.get("ARCHIVO_ESPERA_S") or 30)
+
+
+async def ejecutar_con_espera(fn, *args):
+    limite = asyncio.get_running_loop().time() + ARCHIVO_ESPERA_S
+    while True:
+        try:
+            return await pool_inferencia.ejecutar(fn, *args)
+        except SaturacionInferencia:
+            if asyncio.get_running_loop().time() >= limite:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def volcar_cuerpo(request: Request, tmp):
+    # Escribir a disco es bloqueante: en un hilo, de a ~1 MiB
+    loop = asyncio.get_running_loop()
+    trozos, tam = [], 0
+    async for trozo in request.stream():
+        trozos.append(trozo)
+        tam += len(trozo)
+        if tam >= 1 << 20:
+            await loop.run_in_executor(None, tmp.writelines, trozos)
+            trozos, tam = [], 0
+    if trozos:
+        await loop.run_in_executor(None, tmp.writelines, trozos)
+
+
+def abrir_csv(tmp) -> LectorCSV:
+    """Recorre TODO el archivo (solo parsea, no predice) y lo rebobina: una
+    fila mal formada es un 400 antes de responder, no un 200 cortado a la
+    mitad. Lanza ValueError."""
+    tmp.seek(0)
+    texto = io.TextIOWrapper(tmp, encoding="utf-8-sig", newline="")
+    for _ in LectorCSV(texto):
+        pass
+    texto.seek(0)
+    return LectorCSV(texto)
+
+
+class RespuestaStreaming(StreamingResponse):
+    """StreamingResponse que siempre llama a `al_terminar`, también si el
+    cliente se desconecta antes de que arranque el generador (ahí no corren
+    ni su finally ni un BackgroundTask)."""
+
+    def __init__(self, contenido, al_terminar, **kwargs):
+        super().__init__(contenido, **kwargs)
+        self.al_terminar = al_terminar
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.al_terminar()
+
+
+def linea_error(formato: str, mensaje: str) -> str:
+    # Última línea de una respuesta que se cortó a mitad de camino
+    if formato == "csv":
+        return f"# ERROR: {mensaje}\n"
+    return orjson.dumps({"error": mensaje}).decode() + "\n"
+
+
+@api_router.post("/analizar-anemia/archivo")
+async def analizar_anemia_archivo(
+    request: Request,
+    formato: Literal["csv", "ndjson"] = "csv",
+    modelo: Optional[str] = None,
+):
+    # Cuerpo = CSV crudo como ml/data/anemia_clean.csv (Gender;Hemoglobin;...).
+    # Se vuelca a un archivo temporal y se responde en streaming por bloques:
+    # la memoria no depende del tamaño del archivo.
+    # Todo lo que se puede validar se valida ANTES del primer byte (formato
+    # del archivo, modelo, lugar en el pool para el primer bloque) y sale con
+    # su código de error. Si algo falla después, la respuesta termina con una
+    # línea de error (linea_error) y la conexión se corta: nunca un 200
+    # truncado en silencio.
+    if modelo and not usa_ensamble(modelo) and modelo not in registro.disponibles():
+        raise HTTPException(status_code=404, detail=f"Modelo no disponible: {modelo}")
+
+    loop = asyncio.get_running_loop()
+    tmp = tempfile.TemporaryFile()
+    try:
+        await volcar_cuerpo(request, tmp)
+        try:
+            lector = await loop.run_in_executor(None, abrir_csv, tmp)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        bloques = iter(lector)
+        X = await loop.run_in_executor(None, next, bloques, None)
+        primero = "" if X is None else await inferir_bloque(X, modelo, formato, lector.sep)
+    except BaseException:
+        tmp.close()
+        raise
+
+    async def generar():
+        en_vuelo = deque()
+        try:
+            yield encabezado_salida(formato, lector.sep) + primero
+            while True:
+                # Leer/parsear el bloque también es bloqueante
+                X = await loop.run_in_executor(None, next, bloques, None)
+                if X is None:
+                    break
+                en_vuelo.append(asyncio.ensure_future(
+                    ejecutar_con_espera(puntuar_y_formatear, X, modelo, formato, lector.sep)
+                ))
+                # Varios bloques en paralelo (uno por worker), salida en orden
+                if len(en_vuelo) >= pool_inferencia.workers:
+                    yield await en_vuelo.popleft()
+            while en_vuelo:
+                yield await en_vuelo.popleft()
+        except Exception as e:
+            logger.exception("Error puntuando archivo; respuesta truncada")
+            yield linea_error(formato, str(e) or type(e).__name__)
+            raise
+        finally:
+            for f in en_vuelo:
+                f.cancel()
+
+    media = "text/csv" if formato == "csv" else "application/x-ndjson"
+    return RespuestaStreaming(generar(), al_terminar=tmp.close, media_type=media)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
 
 
 # =========================
@@ -156,6 +746,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Último en agregarse = el más externo: mide también CORS y los errores
+app.add_middleware(MiddlewareMetricas)
+
 
 # =========================
 # Logging
@@ -168,8 +761,40 @@ logger = logging.getLogger(__name__)
 
 
 # =========================
-# Shutdown (por si usas DB luego)
+# Startup
+# =========================
+def precargar_modelo():
+    try:
+        registro.obtener()
+        for nombre in ensamble.miembros if ensamble is not None else ():
+            registro.obtener(nombre)
+    except Exception:
+        # Se reintenta en la primera predicción; /api/listo sigue en 503
+        logger.exception("Error precargando el modelo")
+
+
+@app.on_event("startup")
+async def startup():
+    await microlotes.iniciar()
+    if auditoria is not None:
+        await auditoria.iniciar()
+    if os.environ.get("PERFILADOR") == "1":
+        perfilador.iniciar()
+    # Cargar el modelo sin bloquear el arranque; /api/listo avisa cuando está
+    asyncio.get_running_loop().run_in_executor(None, precargar_modelo)
+
+
+# =========================
+# Shutdown
 # =========================
 @app.on_event("shutdown")
 async def shutdown():
     print("🔻 Cerrando backend…")
+    await microlotes.detener()
+    pool_inferencia.cerrar()
+    if ensamble is not None:
+        ensamble.cerrar()
+    perfilador.detener()
+    if auditoria is not None:
+        # Lo que quedó en la cola se escribe antes de salir
+        await auditoria.detener()
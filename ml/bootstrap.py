@@ -0,0 +1,152 @@
+# === INTERVALOS DE CONFIANZA BOOTSTRAP EN EL 10% HOLD-OUT ===
+# Con ~54 filas, un F1 o Recall puntual del 10% es muy ruidoso para elegir
+# modelo. Aquí se remuestrea (con reemplazo) el hold-out N veces usando las
+# predicciones ya guardadas por evaluacion.py (resultados/predicciones_test10.npz):
+# no se reentrena ni se vuelve a predecir.
+#
+# Cada remuestreo es una FILA de una matriz de índices (N x n): y[idx],
+# pred[idx] y prob[idx] salen de una sola indexación y las métricas se
+# calculan por filas, sin bucles de Python. La AUC usa la fórmula de rangos
+# (Mann-Whitney) con rankdata(axis=1).
+#
+# Los remuestreos se parten en bloques con semillas independientes
+# (SeedSequence.spawn): el resultado es el mismo con 1 o con N procesos.
+#
+#   python bootstrap.py
+#   python bootstrap.py --remuestreos 100000 --procesos 8
+import argparse
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+RESULTS_DIR = "resultados"
+PREDICCIONES = os.path.join(RESULTS_DIR, "predicciones_test10.npz")
+SALIDA = os.path.join(RESULTS_DIR, "bootstrap_ic_test10.csv")
+
+SEMILLA = 42
+METRICAS = ("Accuracy", "Precision", "Recall", "F1", "AUC")
+
+
+def metricas_por_fila(Y, P, S):
+    """Y, P (0/1) y S (prob) de forma (b, n) -> {métrica: arreglo (b,)}.
+
+    Precision/Recall/F1 = 0 cuando no hay denominador (como zero_division=0);
+    AUC = NaN si el remuestreo quedó con una sola clase.
+    """
+    Y = Y.astype(bool)
+    P = P.astype(bool)
+    tp = np.count_nonzero(Y & P, axis=1)
+    fp = np.count_nonzero(~Y & P, axis=1)
+    fn = np.count_nonzero(Y & ~P, axis=1)
+    n = Y.shape[1]
+    n_pos = tp + fn
+    n_neg = n - n_pos
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prec = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        rec = np.where(n_pos > 0, tp / n_pos, 0.0)
+        f1 = np.where(prec + rec > 0, 2 * prec * rec / (prec + rec), 0.0)
+        # AUC = (suma de rangos de los positivos - n_pos(n_pos+1)/2) / (n_pos * n_neg)
+        rangos = rankdata(S, axis=1)
+        suma_pos = np.where(Y, rangos, 0.0).sum(axis=1)
+        auc = np.where((n_pos > 0) & (n_neg > 0),
+                       (suma_pos - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg), np.nan)
+
+    return {
+        "Accuracy": (n - fp - fn) / n,
+        "Precision": prec,
+        "Recall": rec,
+        "F1": f1,
+        "AUC": auc,
+    }
+
+
+def _bloque(args):
+    """Un bloque de remuestreos con su propia semilla (corre en un worker)."""
+    semilla, b, y, preds, probs = args
+    rng = np.random.default_rng(semilla)
+    idx = rng.integers(0, len(y), size=(b, len(y)))
+    Y = y[idx]
+    return {nombre: metricas_por_fila(Y, preds[nombre][idx], probs[nombre][idx]) for nombre in preds}
+
+
+def bootstrap(y, preds, probs, remuestreos, bloque=2000, procesos=1, semilla=SEMILLA):
+    """{modelo: {métrica: arreglo (remuestreos,)}}; mismo resultado con cualquier `procesos`."""
+    tamanos = [bloque] * (remuestreos // bloque) + ([remuestreos % bloque] if remuestreos % bloque else [])
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+    trabajos = [(s, b, y, preds, probs) for s, b in zip(semillas, tamanos)]
+    if procesos > 1:
+        with Pool(min(procesos, len(trabajos))) as pool:
+            partes = pool.map(_bloque, trabajos)
+    else:
+        partes = [_bloque(t) for t in trabajos]
+    return {
+        nombre: {m: np.concatenate([p[nombre][m] for p in partes]) for m in METRICAS}
+        for nombre in preds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intervalos de confianza bootstrap en el 10% hold-out.")
+    parser.add_argument("--remuestreos", type=int, default=10_000)
+    parser.add_argument("--confianza", type=float, default=0.95)
+    parser.add_argument("--bloque", type=int, default=2000, help="remuestreos por bloque (memoria: bloque x filas)")
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    args = parser.parse_args()
+
+    if not os.path.exists(PREDICCIONES):
+        raise FileNotFoundError(f"No encuentro {PREDICCIONES}. Ejecuta primero evaluacion.py.")
+    datos = np.load(PREDICCIONES)
+    y = datos["y"]
+    modelos = [str(m) for m in datos["modelos"]]
+    preds = {m: datos[f"pred_{m}"] for m in modelos}
+    probs = {m: datos[f"prob_{m}"] for m in modelos}
+
+    t0 = time.perf_counter()
+    dist = bootstrap(y, preds, probs, args.remuestreos, args.bloque, args.procesos, args.semilla)
+    segundos = time.perf_counter() - t0
+
+    # Valor puntual = mismas fórmulas sobre el hold-out sin remuestrear
+    puntual = {m: metricas_por_fila(y[None, :], preds[m][None, :], probs[m][None, :]) for m in modelos}
+    alfa = (1 - args.confianza) / 2
+    filas = []
+    for m in modelos:
+        for metrica in METRICAS:
+            valores = dist[m][metrica]
+            validos = valores[~np.isnan(valores)]
+            filas.append({
+                "Modelo": m,
+                "Metrica": metrica,
+                "Valor": float(puntual[m][metrica][0]),
+                "Media": float(validos.mean()) if len(validos) else np.nan,
+                "Desv": float(validos.std(ddof=1)) if len(validos) > 1 else np.nan,
+                "IC_inf": float(np.quantile(validos, alfa)) if len(validos) else np.nan,
+                "IC_sup": float(np.quantile(validos, 1 - alfa)) if len(validos) else np.nan,
+                "Remuestreos": len(validos),
+            })
+    tabla = pd.DataFrame(filas)
+
+    print(f"\n=== 🎲 Bootstrap ({args.remuestreos} remuestreos de {len(y)} filas, "
+          f"IC {args.confianza:.0%}) en {segundos:.2f}s ===\n")
+    ancho = tabla.pivot(index="Modelo", columns="Metrica", values="Valor").loc[modelos, list(METRICAS)]
+    for m in modelos:
+        t = tabla[tabla["Modelo"] == m].set_index("Metrica")
+        print(f"Modelo: {m}")
+        for metrica in METRICAS:
+            r = t.loc[metrica]
+            print(f"  {metrica:9s} {r['Valor']:.4f}  [{r['IC_inf']:.4f}, {r['IC_sup']:.4f}]")
+        print()
+    print("Valores puntuales:")
+    print(ancho.to_string())
+
+    tabla.to_csv(SALIDA, index=False)
+    print(f"\n💾 Guardado '{SALIDA}'")
+
+
+if __name__ == "__main__":
+    main()
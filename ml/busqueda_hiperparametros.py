@@ -0,0 +1,246 @@
+# === BÚSQUEDA DE HIPERPARÁMETROS (SUCCESSIVE HALVING) — SOLO EN EL 90% ===
+# En vez de los valores fijos de entrenamiento.py (300 árboles, k=5, C=1.0):
+#   1) Por cada familia de modelo, HalvingRandomSearchCV: muchas
+#      configuraciones al azar con pocas filas; solo la mejor tercera parte
+#      sigue a la siguiente ronda con el triple de filas (las malas se cortan
+#      temprano). Las 6 familias corren en paralelo (un proceso por familia).
+#      Métrica: promedio de F1 y Recall.
+#   2) Las finalistas de cada familia (+ la configuración actual, como
+#      referencia) se re-evalúan con CV 5-fold completa (F1 y Recall) y se
+#      mide su latencia por fila (predict_proba de 1 fila, como en el backend).
+#   3) Frente de Pareto (Recall, F1, latencia) y, dentro del frente, la
+#      configuración MÁS RÁPIDA que mantiene el Recall (y el F1 dentro de la
+#      tolerancia). Así, el bosque más chico que no pierde sensibilidad.
+#
+# Escribe resultados/hiperparametros.json; entrenamiento.py lo aplica:
+#   HIPERPARAMETROS=/ruta/a/resultados/hiperparametros.json python entrenamiento.py
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform, randint
+
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.metrics import f1_score, recall_score
+from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold, cross_validate
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from carga_datos import leer_dataset
+from entrenamiento import N_FOLDS, SEMILLA, crear_modelos
+
+# RUTAS
+DATA_DIR = "data"
+RESULTS_DIR = "resultados"
+TRAIN_PATH = os.path.join(DATA_DIR, "anemia_train_90.csv")
+SALIDA = os.path.join(RESULTS_DIR, "hiperparametros.json")
+
+N_PROCESOS = int(os.environ.get("N_PROCESOS") or os.cpu_count() or 1)
+N_CANDIDATOS = int(os.environ.get("N_CANDIDATOS") or 60)  # configuraciones por familia en la 1a ronda
+FACTOR = 3  # 1/FACTOR de las configuraciones pasa a la siguiente ronda
+TOLERANCIA_RECALL = float(os.environ.get("TOLERANCIA_RECALL") or 0.0)
+TOLERANCIA_F1 = float(os.environ.get("TOLERANCIA_F1") or 0.005)
+LATENCIA_MAX_MS = float(os.environ.get("LATENCIA_MAX_MS") or 0)  # 0 = sin límite
+REPETICIONES_LATENCIA = 200
+
+# Espacios de búsqueda (los nombres coinciden con crear_modelos())
+ESPACIOS = {
+    "HistGradientBoosting": {
+        "max_iter": randint(20, 300),
+        "learning_rate": loguniform(0.02, 0.3),
+        "max_leaf_nodes": randint(4, 48),
+        "max_depth": [None, 3, 5, 8],
+        "l2_regularization": loguniform(1e-6, 1.0),
+    },
+    "RandomForest": {
+        "n_estimators": randint(5, 400),
+        "max_depth": [None, 4, 6, 8, 12],
+        "min_samples_leaf": randint(1, 8),
+        "max_features": ["sqrt", 0.5, None],
+    },
+    "DecisionTree": {
+        "max_depth": [None, 3, 4, 5, 6, 8, 12],
+        "min_samples_leaf": randint(1, 10),
+        "criterion": ["gini", "entropy"],
+    },
+    "LogisticRegression": {
+        "C": loguniform(1e-3, 1e3),
+    },
+    "SVC_RBF": {
+        "C": loguniform(1e-2, 1e3),
+        "gamma": loguniform(1e-4, 1.0),
+    },
+    "KNN": {
+        "n_neighbors": randint(1, 40),
+        "weights": ["uniform", "distance"],
+        "p": [1, 2],
+    },
+}
+
+
+def f1_recall(estimador, X, y):
+    # Una sola métrica para el halving: F1 y Recall pesan lo mismo
+    pred = estimador.predict(X)
+    return (f1_score(y, pred) + recall_score(y, pred)) / 2
+
+
+def _armar(estimador, escalar):
+    # Mismo artefacto que entrenamiento.py: Pipeline(StandardScaler, modelo)
+    est = clone(estimador)
+    if "n_jobs" in est.get_params():
+        est.set_params(n_jobs=1)  # el paralelismo es por familia
+    if not escalar:
+        return est, ""
+    pipe = make_pipeline(StandardScaler(), est)
+    return pipe, pipe.steps[-1][0] + "__"
+
+
+def _sin_prefijo(params, prefijo):
+    return {k[len(prefijo):]: v for k, v in params.items()}
+
+
+def _nativo(v):
+    # numpy -> tipos de Python (para JSON y para repr estables)
+    return v.item() if isinstance(v, np.generic) else v
+
+
+# =========================
+# Trabajo por familia (un proceso cada una)
+# =========================
+def _buscar(nombre, estimador, escalar, X, y):
+    t0 = time.perf_counter()
+    cv = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEMILLA)
+    modelo, prefijo = _armar(estimador, escalar)
+    espacio = {prefijo + k: v for k, v in ESPACIOS[nombre].items()}
+    busqueda = HalvingRandomSearchCV(
+        modelo, espacio, n_candidates=N_CANDIDATOS, factor=FACTOR, cv=cv,
+        scoring=f1_recall, refit=False, return_train_score=False, random_state=SEMILLA, n_jobs=1,
+    ).fit(X, y)
+
+    # Finalistas: las que llegaron a las dos últimas rondas (las de rondas
+    # anteriores se evaluaron con menos filas y no son comparables)
+    res = busqueda.cv_results_
+    ultimas = np.flatnonzero(res["iter"] >= max(busqueda.n_iterations_ - 2, 0))
+    vistos = set()
+    finalistas = [{k: _nativo(v) for k, v in _sin_prefijo(estimador.get_params(), "").items()
+                   if k in ESPACIOS[nombre]}]  # la configuración actual, como referencia
+    for i in ultimas[np.argsort(-res["mean_test_score"][ultimas], kind="stable")]:
+        params = {k: _nativo(v) for k, v in _sin_prefijo(res["params"][i], prefijo).items()}
+        firma = repr(sorted(params.items()))
+        if firma not in vistos:
+            vistos.add(firma)
+            finalistas.append(params)
+
+    # Re-evaluación de las finalistas con CV completa (todas con los mismos folds)
+    evaluadas = []
+    for j, params in enumerate(finalistas):
+        cand, _ = _armar(clone(estimador).set_params(**params), escalar)
+        cvr = cross_validate(cand, X, y, cv=cv, scoring=("f1", "recall"), n_jobs=1)
+        evaluadas.append({
+            "params": params,
+            "actual": j == 0,
+            "cv_f1": float(cvr["test_f1"].mean()),
+            "cv_recall": float(cvr["test_recall"].mean()),
+        })
+    return nombre, evaluadas, busqueda.n_iterations_, time.perf_counter() - t0
+
+
+# =========================
+# Latencia por fila y frente de Pareto
+# =========================
+def medir_latencia_ms(modelo, X):
+    """Mediana de predict_proba de UNA fila (el caso del backend)."""
+    modelo.predict_proba(X[:1])  # calentar
+    tiempos = np.empty(REPETICIONES_LATENCIA)
+    for i in range(REPETICIONES_LATENCIA):
+        fila = X[i % len(X)][None, :]
+        t = time.perf_counter()
+        modelo.predict_proba(fila)
+        tiempos[i] = time.perf_counter() - t
+    return float(np.median(tiempos) * 1e3)
+
+
+def frente_pareto(candidatos):
+    """Los que ningún otro supera en Recall, F1 y latencia a la vez."""
+    def domina(a, b):
+        mejor_o_igual = (a["cv_recall"] >= b["cv_recall"] and a["cv_f1"] >= b["cv_f1"]
+                         and a["latencia_ms"] <= b["latencia_ms"])
+        estricto = (a["cv_recall"] > b["cv_recall"] or a["cv_f1"] > b["cv_f1"]
+                    or a["latencia_ms"] < b["latencia_ms"])
+        return mejor_o_igual and estricto
+    return [c for c in candidatos if not any(domina(o, c) for o in candidatos if o is not c)]
+
+
+def elegir(frente):
+    # La más rápida que no pierde Recall (y, entre esas, no pierde más F1
+    # que la tolerancia)
+    max_recall = max(c["cv_recall"] for c in frente)
+    validas = [c for c in frente if c["cv_recall"] >= max_recall - TOLERANCIA_RECALL]
+    max_f1 = max(c["cv_f1"] for c in validas)
+    validas = [c for c in validas if c["cv_f1"] >= max_f1 - TOLERANCIA_F1]
+    if LATENCIA_MAX_MS:
+        dentro = [c for c in validas if c["latencia_ms"] <= LATENCIA_MAX_MS]
+        validas = dentro or validas
+    return min(validas, key=lambda c: (c["latencia_ms"], -c["cv_recall"], -c["cv_f1"]))
+
+
+def main():
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    df = leer_dataset(TRAIN_PATH)
+    X = df.drop(columns=["Result"]).to_numpy(dtype=np.float64)
+    y = df["Result"].to_numpy()
+    print(f"✅ Train 90% cargado: {len(X)} filas")
+
+    modelos = crear_modelos()
+    trabajos = [(nombre, est, escalar, X, y) for nombre, (est, escalar) in modelos.items()]
+    print(f"\n=== 🎛️ Successive halving: {len(trabajos)} familias x {N_CANDIDATOS} "
+          f"configuraciones en {min(N_PROCESOS, len(trabajos))} procesos ===\n")
+    t0 = time.perf_counter()
+    with Pool(min(N_PROCESOS, len(trabajos))) as pool:
+        busquedas = pool.starmap(_buscar, trabajos)
+    print(f"⏱️ Búsqueda terminada en {time.perf_counter() - t0:.1f}s\n")
+
+    # La latencia se mide aquí, de a una, para no competir por CPU
+    salida = {"metrica": "(F1 + Recall) / 2", "tolerancia_recall": TOLERANCIA_RECALL,
+              "tolerancia_f1": TOLERANCIA_F1, "latencia_max_ms": LATENCIA_MAX_MS, "modelos": {}}
+    for nombre, evaluadas, rondas, segundos in busquedas:
+        est, escalar = modelos[nombre]
+        for c in evaluadas:
+            modelo, _ = _armar(clone(est).set_params(**c["params"]), escalar)
+            c["latencia_ms"] = medir_latencia_ms(modelo.fit(X, y), X)
+        frente = frente_pareto(evaluadas)
+        elegida = elegir(frente)
+        actual = evaluadas[0]
+
+        print(f"Modelo: {nombre}  ({rondas} rondas, {segundos:.1f}s, {len(evaluadas)} finalistas, "
+              f"{len(frente)} en el frente de Pareto)")
+        for etiqueta, c in (("actual", actual), ("elegida", elegida)):
+            print(f"  {etiqueta:8s} Recall={c['cv_recall']!r}  F1={c['cv_f1']!r}  "
+                  f"latencia={c['latencia_ms']:.3f} ms  {c['params']}")
+        print()
+        salida["modelos"][nombre] = {
+            "params": elegida["params"],
+            "cv_f1": elegida["cv_f1"],
+            "cv_recall": elegida["cv_recall"],
+            "latencia_ms": elegida["latencia_ms"],
+            "actual": actual,
+            "pareto": sorted(frente, key=lambda c: c["latencia_ms"]),
+        }
+
+    with open(SALIDA, "w", encoding="utf-8") as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    tabla = pd.DataFrame([{"Modelo": n, "Recall": m["cv_recall"], "F1": m["cv_f1"],
+                           "Latencia_ms": m["latencia_ms"],
+                           "Latencia_actual_ms": m["actual"]["latencia_ms"]}
+                          for n, m in salida["modelos"].items()])
+    print(tabla)
+    print(f"\n💾 Guardado '{SALIDA}'. Para entrenar con estos valores:")
+    print(f"   HIPERPARAMETROS={os.path.abspath(SALIDA)} python entrenamiento.py")
+
+
+if __name__ == "__main__":
+    main()
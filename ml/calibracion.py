@@ -0,0 +1,172 @@
+# === CALIBRACIÓN POR MODELO (para el ensamble del backend) ===
+# Las probabilidades de los 6 modelos no están en la misma escala (el
+# RandomForest y el árbol se pegan a 0/1, la logística es más suave): antes
+# de promediarlas hay que calibrarlas. Por cada modelo de Modelos/:
+#   1) probabilidades FUERA DE FOLD en el 90% (mismos 5 folds que
+#      entrenamiento.py), con una copia sin ajustar del mismo modelo;
+#   2) regresión isotónica de y sobre esas probabilidades, SOLO si hay
+#      datos para eso: con menos de MIN_FILAS_ISOTONICA filas, o si la
+#      isotónica colapsa en menos de MIN_NIVELES_ISOTONICA niveles (un
+#      escalón 0/1 que no deja nada para promediar), se usa Platt:
+#      sigmoide(a * p + b), con los objetivos suavizados de Platt para que
+#      ni un modelo que separa perfecto dé exactamente 0 o 1;
+#   3) en Modelos/calibracion.json quedan los nodos (x, y) de la isotónica
+#      (el backend hace np.interp) o (a, b) de la sigmoide, sin sklearn.
+# Se reporta el Brier en el 10% hold-out antes y después de calibrar.
+#
+#   python calibracion.py
+#   python calibracion.py randomforest histgradientboosting logisticregression
+import json
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import expit
+from sklearn.base import clone
+from sklearn.isotonic import IsotonicRegression
+from sklearn.metrics import brier_score_loss
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+from carga_datos import COLUMNAS_X, leer_dataset
+
+# RUTAS
+DATA_DIR = "data"
+MODELS_DIR = "Modelos"
+TRAIN_PATH = os.path.join(DATA_DIR, "anemia_train_90.csv")
+TEST_PATH = os.path.join(DATA_DIR, "anemia_test_10_holdout.csv")
+SALIDA = os.path.join(MODELS_DIR, "calibracion.json")
+
+VERSION_CALIBRACION = 2
+SEMILLA = 42
+N_FOLDS = 5
+# Por debajo de esto, isotónica no: Platt
+MIN_FILAS_ISOTONICA = 1000
+MIN_NIVELES_ISOTONICA = 10
+
+
+def nombre_modelo(archivo):
+    # "modelo_randomforest_train90.pkl" -> "randomforest" (como el backend)
+    return archivo[len("modelo_"):-len("_train90.pkl")]
+
+
+def prob_positiva(modelo, X):
+    return modelo.predict_proba(X)[:, list(modelo.classes_).index(1)]
+
+
+def tabla_isotonica(prob_oof, y):
+    """Nodos de la isotónica: entre nodos es lineal y fuera se recorta, que
+    es exactamente np.interp(p, x, y)."""
+    iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip").fit(prob_oof, y)
+    return iso, iso.X_thresholds_.astype(np.float64), iso.y_thresholds_.astype(np.float64)
+
+
+def ajuste_platt(prob_oof, y):
+    """(a, b) de sigmoide(a * p + b) por máxima verosimilitud, con los
+    objetivos de Platt: (N+ + 1) / (N+ + 2) y 1 / (N- + 2) en vez de 1 y 0."""
+    p = np.asarray(prob_oof, dtype=np.float64)
+    y = np.asarray(y)
+    n_pos = int((y == 1).sum())
+    n_neg = len(y) - n_pos
+    t = np.where(y == 1, (n_pos + 1) / (n_pos + 2), 1 / (n_neg + 2))
+
+    def perdida(ab):
+        z = ab[0] * p + ab[1]
+        # -log verosimilitud y su gradiente
+        return np.sum(np.logaddexp(0.0, z) - t * z), np.array([
+            np.sum((expit(z) - t) * p), np.sum(expit(z) - t)])
+
+    inicio = [0.0, np.log((n_pos + 1) / (n_neg + 1))]
+    res = minimize(perdida, inicio, jac=True, method="L-BFGS-B")
+    if not res.success:
+        raise SystemExit(f"❌ Platt no convergió: {res.message}")
+    return float(res.x[0]), float(res.x[1])
+
+
+def calibrador(prob_oof, y):
+    """(entrada del JSON, función p -> p calibrada) según el tamaño del
+    conjunto y cuántos niveles deja la isotónica."""
+    iso, x, v = tabla_isotonica(prob_oof, y)
+    niveles = len(np.unique(v))
+    if len(y) >= MIN_FILAS_ISOTONICA and niveles >= MIN_NIVELES_ISOTONICA:
+        # Entre nodos es lineal y fuera se recorta: exactamente np.interp
+        dif = float(np.abs(np.interp(prob_oof, x, v) - iso.predict(prob_oof)).max())
+        if dif > 1e-12:
+            raise SystemExit(f"❌ La tabla no reproduce la isotónica (máx. diferencia {dif!r})")
+        entrada = {"metodo": "isotonica", "x": x.tolist(), "y": v.tolist()}
+        return entrada, niveles, lambda p: np.interp(p, x, v)
+    a, b = ajuste_platt(prob_oof, y)
+    return {"metodo": "sigmoide", "a": a, "b": b}, niveles, lambda p: expit(a * np.asarray(p) + b)
+
+
+def main():
+    nombres = sys.argv[1:]
+    t0 = time.perf_counter()
+    train_df = leer_dataset(TRAIN_PATH)
+    test_df = leer_dataset(TEST_PATH)
+    X_train, y_train = train_df[COLUMNAS_X], train_df["Result"].to_numpy()
+    # Como en la API: float64 en orden C
+    X_test = np.ascontiguousarray(test_df[COLUMNAS_X].to_numpy(dtype=np.float64))
+    y_test = test_df["Result"].to_numpy()
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    archivos = sorted(
+        f for f in os.listdir(MODELS_DIR)
+        if f.startswith("modelo_") and f.endswith("_train90.pkl")
+        and (not nombres or nombre_modelo(f) in nombres)
+    )
+    cv = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEMILLA)
+
+    modelos, filas = {}, []
+    for archivo in archivos:
+        nombre = nombre_modelo(archivo)
+        final = joblib.load(os.path.join(MODELS_DIR, archivo))
+
+        # 1) Fuera de fold: una copia sin ajustar con los mismos parámetros
+        oof = cross_val_predict(clone(final), X_train, y_train, cv=cv, method="predict_proba")
+        oof = oof[:, list(final.classes_).index(1)]
+
+        # 2) Isotónica o Platt
+        entrada, niveles, calibrar = calibrador(oof, y_train)
+
+        # 3) Hold-out: modelo final sin calibrar vs. calibrado
+        p_test = prob_positiva(final, X_test)
+        p_cal = calibrar(p_test)
+
+        modelos[nombre] = {
+            "origen": archivo,
+            **entrada,
+            "n_calibracion": int(len(y_train)),
+            "niveles_isotonica": niveles,
+            "brier_oof": float(brier_score_loss(y_train, oof)),
+            "brier_oof_calibrado": float(brier_score_loss(y_train, calibrar(oof))),
+        }
+        filas.append({
+            "Modelo": nombre,
+            "Metodo": entrada["metodo"],
+            "Niveles_iso": niveles,
+            "Brier_OOF": modelos[nombre]["brier_oof"],
+            "Brier_OOF_cal": modelos[nombre]["brier_oof_calibrado"],
+            "Brier_test": brier_score_loss(y_test, p_test),
+            "Brier_test_cal": brier_score_loss(y_test, p_cal),
+        })
+
+    if not modelos:
+        raise SystemExit(f"❌ No hay modelos para calibrar en {MODELS_DIR}")
+
+    with open(SALIDA, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION_CALIBRACION, "n_calibracion": int(len(y_train)),
+                   "modelos": modelos}, f, indent=2)
+
+    print(f"\n=== 📐 Calibración fuera de fold ({N_FOLDS} folds, {len(y_train)} filas) en "
+          f"{time.perf_counter() - t0:.2f}s ===\n")
+    print(pd.DataFrame(filas).to_string(index=False))
+    print(f"\n💾 Guardado '{SALIDA}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# === CARGA DE DATOS COMPARTIDA (entrenamiento, evaluación y gráficos) ===
+# Esquema explícito (Gender int8, hemograma float64, Result int8), parser en
+# C/pyarrow en vez del motor "python" con detección de separador, y una
+# copia binaria (.npy) de cada CSV que se reutiliza mientras el CSV no cambie.
+#
+# El hemograma se queda en float64 a propósito: es lo que recibe la API (JSON
+# -> float64). Con float32, 14.9 pasa a ser 14.899999618..., y los modelos de
+# distancia (KNN, SVC con escalado) reentrenados dan otras probabilidades
+# que los servidos.
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_X = ["Gender", "Hemoglobin", "MCH", "MCHC", "MCV"]
+ESQUEMA = {
+    "Gender": np.int8,
+    "Hemoglobin": np.float64,
+    "MCH": np.float64,
+    "MCHC": np.float64,
+    "MCV": np.float64,
+    "Result": np.int8,
+}
+CACHE_DIRNAME = ".cache"
+
+try:
+    import pyarrow  # noqa: F401
+    MOTOR = "pyarrow"
+except ImportError:
+    MOTOR = "c"
+
+# Result en texto -> 0/1 (ajusta/añade valores si tu CSV usa otros textos)
+POS = {"1", "si", "sí", "yes", "positivo", "positive",
+       "anemia", "anémico", "mild", "moderate", "severe"}
+NEG = {"0", "no", "negativo", "negative", "normal", "no anemia", "non-anemia", "non anemia"}
+
+
+def detectar_separador(path):
+    # Basta con el encabezado: ";" (anemia_clean.csv) o "," (particiones)
+    with open(path, encoding="utf-8-sig") as f:
+        encabezado = f.readline()
+    return ";" if encabezado.count(";") > encabezado.count(",") else ","
+
+
+def normalizar_result(y_raw):
+    # Si y ya es numérica (0/1 o 0.0/1.0), úsala directo; si es texto, mapear
+    if pd.api.types.is_numeric_dtype(y_raw):
+        return y_raw.astype(ESQUEMA["Result"])
+
+    def norm(s):
+        s = str(s).strip().lower()
+        s = s.replace("á","a").replace("é","e").replace("í","i").replace("ó","o").replace("ú","u")
+        return s
+
+    y = y_raw.map(lambda v: 1 if norm(v) in POS else (0 if norm(v) in NEG else np.nan))
+    if y.isna().any():
+        unicos = sorted(set(map(lambda v: str(v), y_raw.unique())))
+        raise ValueError(f"Hay valores en Result que no mapeé a 0/1. Revisa y dime cómo mapearlos:\n{unicos}")
+    return y.astype(ESQUEMA["Result"])
+
+
+def _tipar(df):
+    df.columns = [c.strip() for c in df.columns]
+    esperadas = set(COLUMNAS_X) | {"Result"}
+    faltan = esperadas - set(df.columns)
+    if faltan:
+        raise ValueError(f"Faltan columnas en el CSV: {faltan}")
+    df = df[COLUMNAS_X + ["Result"]].copy()
+    df["Result"] = normalizar_result(df["Result"])
+    return df
+
+
+def _leer_csv(path):
+    return _tipar(pd.read_csv(
+        path,
+        sep=detectar_separador(path),
+        engine=MOTOR,
+        # Result sin dtype: puede venir como 0/1, 0.0/1.0 o texto
+        dtype={c: ESQUEMA[c] for c in COLUMNAS_X},
+    ))
+
+
+def leer_por_bloques(path, filas_por_bloque=100_000):
+    """Igual que leer_dataset, pero entrega el CSV de a `filas_por_bloque`
+    filas para que la memoria no dependa del tamaño del archivo."""
+    # pyarrow no lee por bloques: aquí siempre el motor en C
+    lector = pd.read_csv(
+        path,
+        sep=detectar_separador(path),
+        engine="c",
+        dtype={c: ESQUEMA[c] for c in COLUMNAS_X},
+        chunksize=filas_por_bloque,
+    )
+    with lector:
+        for bloque in lector:
+            yield _tipar(bloque)
+
+
+def _ruta_cache(path):
+    # La versión binaria lleva tamaño y fecha del CSV (y el esquema) en el
+    # nombre: si el CSV o los tipos cambian, el nombre ya no coincide y se
+    # regenera
+    st = os.stat(path)
+    carpeta = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+    base = os.path.splitext(os.path.basename(path))[0]
+    esquema = hashlib.sha256(repr(sorted((c, np.dtype(t).str) for c, t in ESQUEMA.items())).encode()).hexdigest()[:8]
+    return carpeta, base, os.path.join(carpeta, f"{base}-{st.st_size}-{st.st_mtime_ns}-{esquema}.npy")
+
+
+def leer_dataset(path, cache=True):
+    """DataFrame con Gender, Hemoglobin, MCH, MCHC, MCV, Result tipados."""
+    if not cache:
+        return _leer_csv(path)
+
+    carpeta, base, ruta = _ruta_cache(path)
+    if os.path.exists(ruta):
+        return pd.DataFrame(np.load(ruta))
+
+    df = _leer_csv(path)
+    os.makedirs(carpeta, exist_ok=True)
+    for viejo in os.listdir(carpeta):
+        if viejo.startswith(base + "-") and viejo.endswith(".npy"):
+            os.remove(os.path.join(carpeta, viejo))
+    registros = df.to_records(index=False, column_dtypes={c: ESQUEMA[c] for c in df.columns})
+    np.save(ruta + ".tmp.npy", registros)
+    os.replace(ruta + ".tmp.npy", ruta)
+    return df
+
+
+def leer_xy(path, cache=True):
+    df = leer_dataset(path, cache)
+    return df[COLUMNAS_X], df["Result"]
@@ -1,11 +1,29 @@
 # === ENTRENAMIENTO Y COMPARATIVA EN EL 90% (CV 5-FOLD) — SIN REDONDEAR ===
+# Los 6 modelos x 5 folds (+ el ajuste final con todo el 90%) son trabajos
+# independientes: se reparten en un pool de procesos en vez de correr uno
+# tras otro. Los folds se calculan UNA vez y el escalado (StandardScaler) de
+# cada fold se precalcula una sola vez y lo comparten los 3 modelos que lo
+# usan. Con PRESUPUESTO_ENTRENAMIENTO_S se pone un límite de tiempo total.
+#
+# Cada trabajo se guarda en una caché direccionada por contenido (huella del
+# dataset + semilla del split + clase y parámetros del modelo + fold): si
+# nada de eso cambió, la métrica o el modelo ajustado se reutilizan y solo
+# se entrena lo que cambió.
+import hashlib
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
 import pandas as pd
 import numpy as np
 import joblib
-import os
 
-from sklearn.model_selection import StratifiedKFold, cross_validate, train_test_split
-from sklearn.metrics import make_scorer, accuracy_score, precision_score, recall_score, f1_score
+import sklearn
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 # Modelos
 from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
@@ -17,117 +35,304 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import make_pipeline
 
-# 1) Cargar dataset (detección de separador)
-def leer_csv_seguro(path):
-    df = pd.read_csv(path, sep=None, engine="python")
-    df.columns = [c.strip() for c in df.columns]
-    if len(df.columns) == 1:
-        df = pd.read_csv(path, sep=";", engine="python")
-        df.columns = [c.strip() for c in df.columns]
-    return df
+from carga_datos import ESQUEMA, leer_dataset
+
+# El perfil de referencia lo lee el monitor de deriva del backend: mismos bordes
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from deriva import VARIABLES, perfil_referencia  # noqa: E402
 
 CSV_PATH = "anemia_clean.csv"
-if not os.path.exists(CSV_PATH):
-    raise FileNotFoundError("No se encontró 'anemia_clean.csv' en la carpeta actual.")
-
-df = leer_csv_seguro(CSV_PATH)
-print(f"✅ Dataset cargado con {len(df)} filas")
-print("Columnas:", list(df.columns))
-
-# Validar columnas esperadas
-esperadas = {"Gender", "Hemoglobin", "MCH", "MCHC", "MCV", "Result"}
-faltan = esperadas - set(df.columns)
-if faltan:
-    raise ValueError(f"Faltan columnas en el CSV: {faltan}")
-
-# 2) Preparar X, y (Result -> 0/1 si viniera en texto)
-X = df[["Gender", "Hemoglobin", "MCH", "MCHC", "MCV"]].copy()
-y_raw = df["Result"].copy()
-
-# Si y ya es numérica (0/1), úsala directo; si es texto, mapear
-if pd.api.types.is_numeric_dtype(y_raw):
-    y = y_raw.astype(int)
-else:
-    # Ajusta/añade valores si tu CSV usa otros textos
-    POS = {"1", "si", "sí", "yes", "positivo", "positive",
-           "anemia", "anémico", "mild", "moderate", "severe"}
-    NEG = {"0", "no", "negativo", "negative", "normal", "no anemia", "non-anemia", "non anemia"}
-
-    def norm(s):
-        s = str(s).strip().lower()
-        s = s.replace("á","a").replace("é","e").replace("í","i").replace("ó","o").replace("ú","u")
-        return s
-
-    y = y_raw.map(lambda v: 1 if norm(v) in POS else (0 if norm(v) in NEG else np.nan))
-    if y.isna().any():
-        unicos = sorted(set(map(lambda v: str(v), y_raw.unique())))
-        raise ValueError(f"Hay valores en Result que no mapeé a 0/1. Revisa y dime cómo mapearlos:\n{unicos}")
-
-print("Distribución de y:", y.value_counts().to_dict())
-
-# 3) Split estratificado 90%/10% (guardamos el 10% para después, sin evaluarlo ahora)
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.10, random_state=42, stratify=y
-)
-print(f"📦 Split 90/10 -> train: {X_train.shape[0]}  |  test (hold-out): {X_test.shape[0]}")
-
-# Guardar particiones (útil para la etapa del 10% luego)
-train_out = X_train.copy(); train_out["Result"] = y_train.values
-test_out  = X_test.copy();  test_out["Result"]  = y_test.values
-train_out.to_csv("anemia_train_90.csv", index=False)
-test_out.to_csv("anemia_test_10_holdout.csv", index=False)
-print("💾 Guardados anemia_train_90.csv y anemia_test_10_holdout.csv")
-
-# 4) Modelos (6)
-modelos = {
-    "HistGradientBoosting": HistGradientBoostingClassifier(random_state=42),
-    "RandomForest": RandomForestClassifier(n_estimators=300, random_state=42, n_jobs=-1),
-    "DecisionTree": DecisionTreeClassifier(random_state=42),
-    "LogisticRegression": make_pipeline(StandardScaler(), LogisticRegression(max_iter=500, random_state=42)),
-    "SVC_RBF": make_pipeline(StandardScaler(), SVC(kernel="rbf", C=1.0, gamma="scale", probability=True, random_state=42)),
-    "KNN": make_pipeline(StandardScaler(), KNeighborsClassifier(n_neighbors=5, weights="distance")),
-}
-
-# 5) Validación cruzada 5-fold SOLO sobre el 90% (sin redondear)
-cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-scoring = {
-    "acc":  make_scorer(accuracy_score),
-    "prec": make_scorer(precision_score),
-    "rec":  make_scorer(recall_score),
-    "f1":   make_scorer(f1_score),
-}
-
-print("\n=== 🔍 Validación cruzada (5-fold) sobre el 90% (train) ===\n")
-resultados = []
-for nombre, modelo in modelos.items():
-    res = cross_validate(modelo, X_train, y_train, cv=cv, scoring=scoring, return_train_score=False)
-    # SIN REDONDEAR: usar repr(float(...)) para imprimir toda la precisión disponible
-    print(f"Modelo: {nombre}")
-    print("  Accuracy (mean):  ", repr(float(res['test_acc'].mean())))
-    print("  Precision (mean): ", repr(float(res['test_prec'].mean())))
-    print("  Recall (mean):    ", repr(float(res['test_rec'].mean())))
-    print("  F1-Score (mean):  ", repr(float(res['test_f1'].mean())), "\n")
-
-    resultados.append({
-        "Modelo": nombre,
-        "Accuracy": res['test_acc'].mean(),
-        "Precision": res['test_prec'].mean(),
-        "Recall": res['test_rec'].mean(),
-        "F1-Score": res['test_f1'].mean(),
-    })
-
-# 6) Tabla comparativa del 90% y guardado
-tabla = pd.DataFrame(resultados)
-print("📊 Resultados comparativos (CV en el 90% — sin redondear al imprimir):\n")
-print(tabla)
-
-tabla.to_csv("resultados_modelos_cv_train90.csv", index=False)
-print("💾 Guardado 'resultados_modelos_cv_train90.csv'")
-
-# 7) Entrenar modelos finales con TODO el 90% y guardarlos
-for nombre, modelo in modelos.items():
-    modelo.fit(X_train, y_train)
-    joblib.dump(modelo, f"modelo_{nombre.lower()}_train90.pkl")
-print("💾 Modelos guardados (*.pkl) entrenados con el 90% de datos.")
-
-print("\n✅ Listo. El 10% quedó reservado para evaluarlo luego cuando me digas.")
\ No newline at end of file
+N_PROCESOS = int(os.environ.get("N_PROCESOS") or os.cpu_count() or 1)
+PRESUPUESTO_S = float(os.environ.get("PRESUPUESTO_ENTRENAMIENTO_S") or 0)  # 0 = sin límite
+FINAL = -1  # "fold" del ajuste final con todo el 90%
+SEMILLA = 42
+N_FOLDS = 5
+CACHE_DIR = os.environ.get("CACHE_ENTRENAMIENTO") or "cache_entrenamiento"
+MANIFIESTO = os.path.join(CACHE_DIR, "manifiesto.json")  # pkl -> clave del ajuste final
+# Configuración elegida por busqueda_hiperparametros.py (si no existe, los valores de abajo)
+HIPERPARAMETROS = os.environ.get("HIPERPARAMETROS") or "hiperparametros.json"
+# Distribución de entrenamiento para el monitor de deriva (backend/deriva.py)
+PERFIL_REFERENCIA = "perfil_referencia.json"
+
+
+# 4) Modelos (6): (estimador, usa StandardScaler)
+def crear_modelos(hiperparametros=None):
+    modelos = {
+        "HistGradientBoosting": (HistGradientBoostingClassifier(random_state=42), False),
+        "RandomForest": (RandomForestClassifier(n_estimators=300, random_state=42, n_jobs=-1), False),
+        "DecisionTree": (DecisionTreeClassifier(random_state=42), False),
+        "LogisticRegression": (LogisticRegression(max_iter=500, random_state=42), True),
+        "SVC_RBF": (SVC(kernel="rbf", C=1.0, gamma="scale", probability=True, random_state=42), True),
+        "KNN": (KNeighborsClassifier(n_neighbors=5, weights="distance"), True),
+    }
+    # Los parámetros buscados cambian la clave de caché: solo se reentrena
+    # lo que cambió
+    for nombre, params in (hiperparametros or {}).items():
+        if nombre in modelos:
+            modelos[nombre][0].set_params(**params)
+    return modelos
+
+
+def leer_hiperparametros(path=HIPERPARAMETROS):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {nombre: conf["params"] for nombre, conf in json.load(f)["modelos"].items()}
+
+
+# =========================
+# Caché de trabajos (direccionada por contenido)
+# =========================
+def huella_archivo(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def clave_trabajo(huella_datos, estimador, escalar, fold):
+    # n_jobs/verbose no cambian el resultado: no forman parte de la clave
+    params = {k: v for k, v in estimador.get_params().items() if k not in ("n_jobs", "verbose")}
+    texto = repr((
+        huella_datos, sorted((c, np.dtype(t).str) for c, t in ESQUEMA.items()),
+        SEMILLA, N_FOLDS, sklearn.__version__,
+        type(estimador).__module__, type(estimador).__qualname__,
+        sorted(params.items()), escalar, fold,
+    ))
+    return hashlib.sha256(texto.encode()).hexdigest()[:24]
+
+
+def cache_leer(clave):
+    path = os.path.join(CACHE_DIR, f"{clave}.pkl")
+    return joblib.load(path) if os.path.exists(path) else None
+
+
+def cache_guardar(clave, valor):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{clave}.pkl")
+    joblib.dump(valor, path + ".tmp")
+    os.replace(path + ".tmp", path)  # atómico: nunca queda a medias
+
+
+def leer_manifiesto():
+    if not os.path.exists(MANIFIESTO):
+        return {}
+    with open(MANIFIESTO, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# =========================
+# Trabajos del pool (un proceso por trabajo modelo x fold)
+# =========================
+# Datos compartidos de cada worker: se envían una vez al crear el pool, no
+# con cada trabajo.
+_datos = {}
+
+
+def _iniciar_worker(datos):
+    _datos.update(datos)
+
+
+def _ajustar(nombre, estimador, escalar, fold):
+    est = clone(estimador)
+    # El paralelismo ya es por trabajo: que el modelo no abra más hilos
+    if "n_jobs" in est.get_params():
+        est.set_params(n_jobs=1)
+
+    if fold == FINAL:
+        X_tr = _datos["escalado_final"] if escalar else _datos["X"]
+        est.fit(X_tr, _datos["y"])
+        return nombre, fold, est
+
+    tr, te = _datos["splits"][fold]
+    if escalar:
+        X_tr, X_te = _datos["escalados"][fold]
+    else:
+        X_tr, X_te = _datos["X"].iloc[tr], _datos["X"].iloc[te]
+    y_tr, y_te = _datos["y"].iloc[tr], _datos["y"].iloc[te]
+
+    est.fit(X_tr, y_tr)
+    y_pred = est.predict(X_te)
+    return nombre, fold, {
+        "acc": accuracy_score(y_te, y_pred),
+        "prec": precision_score(y_te, y_pred),
+        "rec": recall_score(y_te, y_pred),
+        "f1": f1_score(y_te, y_pred),
+        # Fuera de fold: referencia de prob_anemia para el monitor de deriva
+        "prob": est.predict_proba(X_te)[:, list(est.classes_).index(1)],
+    }
+
+
+def main():
+    if not os.path.exists(CSV_PATH):
+        raise FileNotFoundError("No se encontró 'anemia_clean.csv' en la carpeta actual.")
+
+    # 1-2) Cargar dataset tipado (Result -> 0/1 si viniera en texto)
+    huella_datos = huella_archivo(CSV_PATH)
+    df = leer_dataset(CSV_PATH)
+    print(f"✅ Dataset cargado con {len(df)} filas")
+    print("Columnas:", list(df.columns))
+
+    X, y = df.drop(columns=["Result"]), df["Result"]
+    print("Distribución de y:", y.value_counts().to_dict())
+
+    # 3) Split estratificado 90%/10% (guardamos el 10% para después, sin evaluarlo ahora)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.10, random_state=SEMILLA, stratify=y
+    )
+    print(f"📦 Split 90/10 -> train: {X_train.shape[0]}  |  test (hold-out): {X_test.shape[0]}")
+
+    # Guardar particiones (útil para la etapa del 10% luego)
+    train_out = X_train.copy(); train_out["Result"] = y_train.values
+    test_out  = X_test.copy();  test_out["Result"]  = y_test.values
+    train_out.to_csv("anemia_train_90.csv", index=False)
+    test_out.to_csv("anemia_test_10_holdout.csv", index=False)
+    print("💾 Guardados anemia_train_90.csv y anemia_test_10_holdout.csv")
+
+    hiperparametros = leer_hiperparametros()
+    if hiperparametros:
+        print(f"🎛️ Hiperparámetros de {HIPERPARAMETROS}: {', '.join(hiperparametros)}")
+    modelos = crear_modelos(hiperparametros)
+
+    # 5) Validación cruzada 5-fold SOLO sobre el 90% (sin redondear)
+    # Folds y escalado por fold: se calculan una vez para todos los modelos
+    cv = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=SEMILLA)
+    splits = list(cv.split(X_train, y_train))
+    escalados = []
+    for tr, te in splits:
+        scaler = StandardScaler().fit(X_train.iloc[tr])
+        escalados.append((scaler.transform(X_train.iloc[tr]), scaler.transform(X_train.iloc[te])))
+    scaler_final = StandardScaler().fit(X_train)
+
+    datos = {
+        "X": X_train,
+        "y": y_train,
+        "splits": splits,
+        "escalados": escalados,
+        "escalado_final": scaler_final.transform(X_train),
+    }
+
+    # Lo que ya está en caché no se vuelve a entrenar
+    folds = {nombre: {} for nombre in modelos}
+    finales = {}
+    claves = {}
+    trabajos = []
+    for nombre, (est, escalar) in modelos.items():
+        for fold in list(range(len(splits))) + [FINAL]:
+            clave = clave_trabajo(huella_datos, est, escalar, fold)
+            claves[nombre, fold] = clave
+            resultado = cache_leer(clave)
+            # Folds cacheados antes de guardar "prob": se recalculan
+            if resultado is None or (fold != FINAL and "prob" not in resultado):
+                trabajos.append((nombre, est, escalar, fold))
+            elif fold == FINAL:
+                finales[nombre] = resultado
+            else:
+                folds[nombre][fold] = resultado
+    en_cache = len(claves) - len(trabajos)
+
+    print(f"\n=== 🔍 Validación cruzada (5-fold) sobre el 90% (train) — "
+          f"{len(trabajos)} trabajos en {N_PROCESOS} procesos, {en_cache} desde caché ===\n")
+    t0 = time.perf_counter()
+    pool = Pool(min(N_PROCESOS, len(trabajos)), initializer=_iniciar_worker, initargs=(datos,)) if trabajos else None
+    try:
+        pendientes = [pool.apply_async(_ajustar, t) for t in trabajos]
+        while pendientes:
+            if PRESUPUESTO_S and time.perf_counter() - t0 > PRESUPUESTO_S:
+                print(f"⏱️ Presupuesto de {PRESUPUESTO_S:.0f}s agotado: "
+                      f"{len(pendientes)} trabajos sin terminar se descartan")
+                pool.terminate()
+                break
+            listos = [r for r in pendientes if r.ready()]
+            for r in listos:
+                nombre, fold, resultado = r.get()
+                cache_guardar(claves[nombre, fold], resultado)
+                if fold == FINAL:
+                    finales[nombre] = resultado
+                else:
+                    folds[nombre][fold] = resultado
+            pendientes = [r for r in pendientes if r not in listos]
+            if pendientes and not listos:
+                pendientes[0].wait(0.05)
+        else:
+            if pool is not None:
+                pool.close()
+    finally:
+        if pool is not None:
+            pool.join()
+    print(f"⏱️ Trabajos terminados en {time.perf_counter() - t0:.2f}s\n")
+
+    resultados = []
+    completos = []
+    for nombre in modelos:
+        if len(folds[nombre]) < len(splits) or nombre not in finales:
+            print(f"⚠️ Modelo: {nombre} — sin terminar dentro del presupuesto, se omite\n")
+            continue
+        completos.append(nombre)
+        res = {k: np.array([folds[nombre][f][k] for f in range(len(splits))])
+               for k in ("acc", "prec", "rec", "f1")}
+        # SIN REDONDEAR: usar repr(float(...)) para imprimir toda la precisión disponible
+        print(f"Modelo: {nombre}")
+        print("  Accuracy (mean):  ", repr(float(res['acc'].mean())))
+        print("  Precision (mean): ", repr(float(res['prec'].mean())))
+        print("  Recall (mean):    ", repr(float(res['rec'].mean())))
+        print("  F1-Score (mean):  ", repr(float(res['f1'].mean())), "\n")
+
+        resultados.append({
+            "Modelo": nombre,
+            "Accuracy": res['acc'].mean(),
+            "Precision": res['prec'].mean(),
+            "Recall": res['rec'].mean(),
+            "F1-Score": res['f1'].mean(),
+        })
+
+    # 6) Tabla comparativa del 90% y guardado
+    tabla = pd.DataFrame(resultados)
+    print("📊 Resultados comparativos (CV en el 90% — sin redondear al imprimir):\n")
+    print(tabla)
+
+    tabla.to_csv("resultados_modelos_cv_train90.csv", index=False)
+    print("💾 Guardado 'resultados_modelos_cv_train90.csv'")
+
+    # 7) Guardar los modelos finales (ya entrenados con TODO el 90% en el pool)
+    # Un .pkl que ya corresponde a la misma clave no se vuelve a escribir
+    # (así tampoco cambia su fecha y el backend no lo recarga sin motivo).
+    manifiesto = leer_manifiesto()
+    for nombre in completos:
+        est, escalar = modelos[nombre]
+        destino = f"modelo_{nombre.lower()}_train90.pkl"
+        if manifiesto.get(destino) == claves[nombre, FINAL] and os.path.exists(destino):
+            print(f"⏭️ {destino} sin cambios")
+            continue
+        final = finales[nombre]
+        if "n_jobs" in est.get_params():
+            final.set_params(n_jobs=est.get_params()["n_jobs"])
+        # Mismo artefacto que antes: Pipeline(StandardScaler, modelo) ya ajustado
+        modelo = make_pipeline(scaler_final, final) if escalar else final
+        joblib.dump(modelo, destino)
+        manifiesto[destino] = claves[nombre, FINAL]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(MANIFIESTO, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2)
+    print("💾 Modelos guardados (*.pkl) entrenados con el 90% de datos.")
+
+    # 8) Perfil de referencia para el monitor de deriva del backend:
+    # histogramas de las entradas del 90% y, por modelo, de su prob_anemia
+    # fuera de fold (la de predict_proba sobre el mismo 90% es optimista)
+    probs_oof = {}
+    for nombre in completos:
+        oof = np.empty(len(y_train))
+        for f, (_, te) in enumerate(splits):
+            oof[te] = folds[nombre][f]["prob"]
+        probs_oof[nombre.lower()] = oof
+    perfil = perfil_referencia(X_train[list(VARIABLES)].to_numpy(), probs_oof, dataset=huella_datos[:12])
+    with open(PERFIL_REFERENCIA, "w", encoding="utf-8") as f:
+        json.dump(perfil, f, indent=2)
+    print(f"💾 Guardado '{PERFIL_REFERENCIA}' (referencia para /api/deriva)")
+
+    print("\n✅ Listo. El 10% quedó reservado para evaluarlo luego cuando me digas.")
+
+
+if __name__ == "__main__":
+    main()
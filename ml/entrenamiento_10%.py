@@ -4,6 +4,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import joblib
 
+from carga_datos import leer_dataset
+
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 # RUTAS
@@ -19,9 +21,9 @@ os.makedirs(PLOTS_DIR, exist_ok=True)
 TEST_PATH = os.path.join(DATA_DIR, "anemia_test_10_holdout.csv")
 
 # Cargar datos del TEST (10%)
-test_df = pd.read_csv(TEST_PATH)
+test_df = leer_dataset(TEST_PATH)
 X_test = test_df.drop(columns=["Result"])
-y_test = test_df["Result"].astype(int)
+y_test = test_df["Result"]
 
 # Lista de modelos
 model_files = {
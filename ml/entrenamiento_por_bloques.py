@@ -0,0 +1,214 @@
+# === ENTRENAMIENTO POR BLOQUES (datasets que no caben en memoria) ===
+# Misma idea que entrenamiento.py, pero el CSV se recorre de a bloques y
+# nunca está entero en memoria:
+#   - Split 90/10 estratificado por hash (no train_test_split): cada fila
+#     cae en el 10% según un hash de (semilla, clase, posición dentro de su
+#     clase), así en cada recorrido del archivo la fila cae del mismo lado.
+#   - StandardScaler y SGDClassifier (regresión logística, log_loss) con
+#     partial_fit, EPOCAS pasadas sobre el 90%.
+#   - HistGradientBoosting sobre una muestra (reservorio) del 90% de tamaño fijo.
+#   - Evaluación en el 10% recorriendo el archivo: solo se acumulan conteos
+#     de la matriz de confusión.
+#
+#   python entrenamiento_por_bloques.py tamizaje_nacional.csv
+#   python entrenamiento_por_bloques.py tamizaje_nacional.csv --epocas 3 --muestra 500000
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from carga_datos import COLUMNAS_X, leer_por_bloques
+
+SEMILLA = 42
+PARTES = 10  # 1 de cada 10 filas de cada clase va al hold-out
+CLASES = np.array([0, 1])
+
+
+# =========================
+# Split estratificado por hash
+# =========================
+def _splitmix64(x):
+    # Mezcla de enteros de 64 bits (vectorizada); el desborde es intencional
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+class SplitPorHash:
+    """Marca qué filas son hold-out, bloque a bloque.
+
+    Las filas de cada clase se cuentan en orden de aparición; de cada grupo
+    de PARTES filas consecutivas de la misma clase, UNA (elegida por hash)
+    va al hold-out. Así el 10% es exacto por clase (estratificado) sin
+    conocer el tamaño del archivo, y es el mismo en cada recorrido.
+    """
+
+    def __init__(self, semilla: int = SEMILLA):
+        self.semilla = np.uint64(semilla)
+        self.vistos = {int(c): 0 for c in CLASES}
+
+    def holdout(self, y: np.ndarray) -> np.ndarray:
+        mascara = np.zeros(len(y), dtype=bool)
+        for c in CLASES:
+            filas = np.flatnonzero(y == c)
+            pos = np.arange(self.vistos[int(c)], self.vistos[int(c)] + len(filas), dtype=np.uint64)
+            self.vistos[int(c)] += len(filas)
+            grupo = pos // np.uint64(PARTES)
+            elegida = _splitmix64(_splitmix64(self.semilla ^ np.uint64(c)) ^ grupo) % np.uint64(PARTES)
+            mascara[filas] = pos % np.uint64(PARTES) == elegida
+        return mascara
+
+
+def recorrer(path, filas_por_bloque, semilla):
+    """(X, y, es_holdout) por bloque, con X float64 en el orden de COLUMNAS_X
+    (el dtype de la API: ver carga_datos.py)."""
+    split = SplitPorHash(semilla)
+    for df in leer_por_bloques(path, filas_por_bloque):
+        X = df[COLUMNAS_X].to_numpy(dtype=np.float64)
+        y = df["Result"].to_numpy()
+        yield X, y, split.holdout(y)
+
+
+# =========================
+# Muestra de tamaño fijo (reservorio) para HistGradientBoosting
+# =========================
+class Reservorio:
+    """Muestra uniforme de hasta `capacidad` filas de un flujo (algoritmo R)."""
+
+    def __init__(self, capacidad: int, rng: np.random.Generator):
+        self.capacidad = capacidad
+        self.rng = rng
+        self.X = np.empty((capacidad, len(COLUMNAS_X)), dtype=np.float64)
+        self.y = np.empty(capacidad, dtype=np.int8)
+        self.vistos = 0
+
+    def agregar(self, X, y):
+        # Primero se llena; después la fila i (global) reemplaza a una
+        # posición al azar en [0, i] si cae dentro de la capacidad.
+        libres = max(0, min(self.capacidad - self.vistos, len(X)))
+        self.X[self.vistos:self.vistos + libres] = X[:libres]
+        self.y[self.vistos:self.vistos + libres] = y[:libres]
+        resto = np.arange(self.vistos + libres, self.vistos + len(X))
+        if len(resto):
+            destino = self.rng.integers(0, resto + 1)
+            entra = destino < self.capacidad
+            # Con destinos repetidos gana la última fila, igual que en el
+            # algoritmo fila a fila
+            self.X[destino[entra]] = X[libres:][entra]
+            self.y[destino[entra]] = y[libres:][entra]
+        self.vistos += len(X)
+
+    def muestra(self):
+        n = min(self.vistos, self.capacidad)
+        return self.X[:n], self.y[:n]
+
+
+def metricas(conteo):
+    # conteo = bincount(2*y + pred): [tn, fp, fn, tp]
+    tn, fp, fn, tp = (int(v) for v in conteo)
+    total = tn + fp + fn + tp
+    prec = tp / (tp + fp) if tp + fp else 0.0
+    rec = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "Accuracy": (tp + tn) / total if total else 0.0,
+        "Precision": prec,
+        "Recall": rec,
+        "F1-Score": 2 * prec * rec / (prec + rec) if prec + rec else 0.0,
+        "TN": tn, "FP": fp, "FN": fn, "TP": tp,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena por bloques (memoria acotada) sobre un CSV grande.")
+    parser.add_argument("entrada", help="CSV con Gender, Hemoglobin, MCH, MCHC, MCV, Result (';' o ',')")
+    parser.add_argument("--filas-por-bloque", type=int, default=100_000)
+    parser.add_argument("--epocas", type=int, default=5, help="pasadas de SGD sobre el 90%%")
+    parser.add_argument("--muestra", type=int, default=200_000,
+                        help="filas del 90%% para HistGradientBoosting (0 = no entrenarlo)")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+    t0 = time.perf_counter()
+
+    # 1) Primera pasada: escalado (partial_fit), conteos y reservorio
+    scaler = StandardScaler()
+    reservorio = Reservorio(args.muestra, rng) if args.muestra > 0 else None
+    n_train = np.zeros(2, dtype=np.int64)
+    n_test = np.zeros(2, dtype=np.int64)
+    for X, y, ho in recorrer(args.entrada, args.filas_por_bloque, args.semilla):
+        n_train += np.bincount(y[~ho], minlength=2)
+        n_test += np.bincount(y[ho], minlength=2)
+        if (~ho).any():
+            scaler.partial_fit(X[~ho])
+            if reservorio is not None:
+                reservorio.agregar(X[~ho], y[~ho])
+    if not n_train.sum():
+        raise ValueError("El archivo no tiene filas para entrenar")
+    print(f"✅ Dataset recorrido en {time.perf_counter() - t0:.1f}s")
+    print(f"📦 Split 90/10 por hash -> train: {n_train.sum()} {n_train.tolist()}  |  "
+          f"test (hold-out): {n_test.sum()} {n_test.tolist()}")
+
+    # 2) SGD (log_loss = regresión logística) de a bloques, EPOCAS pasadas
+    sgd = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=args.semilla)
+    for epoca in range(args.epocas):
+        t = time.perf_counter()
+        for X, y, ho in recorrer(args.entrada, args.filas_por_bloque, args.semilla):
+            orden = rng.permutation(np.flatnonzero(~ho))  # barajar dentro del bloque
+            if len(orden):
+                sgd.partial_fit(scaler.transform(X[orden]), y[orden], classes=CLASES)
+        print(f"🔁 SGD época {epoca + 1}/{args.epocas} en {time.perf_counter() - t:.1f}s")
+    modelos = {"SGD_Logistico": make_pipeline(scaler, sgd)}
+
+    # 3) HistGradientBoosting sobre la muestra de tamaño fijo
+    if reservorio is not None:
+        X_m, y_m = reservorio.muestra()
+        t = time.perf_counter()
+        hgb = HistGradientBoostingClassifier(random_state=args.semilla).fit(X_m, y_m)
+        print(f"🌲 HistGradientBoosting con {len(X_m)} filas en {time.perf_counter() - t:.1f}s")
+        modelos["HistGradientBoosting"] = hgb
+
+    # 4) Evaluación en el 10% hold-out (recorriendo el archivo otra vez)
+    conteos = {nombre: np.zeros(4, dtype=np.int64) for nombre in modelos}
+    for X, y, ho in recorrer(args.entrada, args.filas_por_bloque, args.semilla):
+        if not ho.any():
+            continue
+        X_te, y_te = X[ho], y[ho].astype(np.int64)
+        for nombre, modelo in modelos.items():
+            pred = modelo.predict(X_te).astype(np.int64)
+            conteos[nombre] += np.bincount(2 * y_te + pred, minlength=4)
+
+    print("\n=== 🔍 Evaluación en el 10% HOLD-OUT (por bloques) ===\n")
+    resultados = []
+    for nombre, conteo in conteos.items():
+        res = metricas(conteo)
+        print(f"Modelo: {nombre}")
+        for k in ("Accuracy", "Precision", "Recall", "F1-Score"):
+            print(f"  {k}: {res[k]!r}")
+        print(f"  Matriz de confusión: TN={res['TN']} FP={res['FP']} FN={res['FN']} TP={res['TP']}\n")
+        resultados.append({"Modelo": nombre, **res})
+
+    tabla = pd.DataFrame(resultados)
+    tabla.to_csv("resultados_modelos_bloques.csv", index=False)
+    print("💾 Guardado 'resultados_modelos_bloques.csv'")
+
+    # 5) Guardar modelos (el backend los ve como "sgd_logistico_bloques", etc.)
+    for nombre, modelo in modelos.items():
+        destino = f"modelo_{nombre.lower()}_bloques_train90.pkl"
+        joblib.dump(modelo, destino)
+        print(f"💾 {destino}")
+
+    print(f"\n✅ Listo en {time.perf_counter() - t0:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
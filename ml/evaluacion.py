@@ -0,0 +1,298 @@
+# === EVALUACIÓN DEL 10% HOLD-OUT + GRÁFICOS (UN SOLO COMANDO) ===
+# Reemplaza correr por separado entrenamiento_10%.py, prueba_de_campo_10%.py
+# y graficos_clinicos.py (que cargan cada uno los mismos .pkl y CSV):
+#   1) Datos y modelos se cargan UNA vez; cada modelo hace UNA pasada de
+#      predict_proba sobre el 10% y de ahí salen la clase predicha, las
+#      métricas, la matriz de confusión y la curva ROC.
+#   2) Los gráficos se dibujan en procesos aparte (backend "Agg", sin
+#      pantalla), en paralelo.
+#   3) Un gráfico cuyas entradas (datos + código que lo dibuja) no cambiaron
+#      desde la última corrida no se vuelve a dibujar.
+#
+#   python evaluacion.py
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # también para los workers
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.metrics import (accuracy_score, auc, confusion_matrix, f1_score,
+                             precision_score, recall_score, roc_curve)
+
+from carga_datos import COLUMNAS_X, leer_dataset
+
+# RUTAS
+DATA_DIR = "data"
+MODELS_DIR = "Modelos"
+RESULTS_DIR = "resultados"
+PLOTS_DIR = "Graficos"
+TEST_PATH = os.path.join(DATA_DIR, "anemia_test_10_holdout.csv")
+TRAIN_PATH = os.path.join(DATA_DIR, "anemia_train_90.csv")
+MANIFIESTO = os.path.join(PLOTS_DIR, ".manifiesto_graficos.json")  # png -> huella de sus entradas
+
+DPI = int(os.environ.get("GRAFICOS_DPI") or 250)
+N_PROCESOS = int(os.environ.get("N_PROCESOS") or os.cpu_count() or 1)
+
+# Lista de modelos (prefijo = nombre corto en los archivos de gráficos)
+model_files = {
+    "HistGradientBoosting": "modelo_histgradientboosting_train90.pkl",
+    "RandomForest": "modelo_randomforest_train90.pkl",
+    "DecisionTree": "modelo_decisiontree_train90.pkl",
+    "LogisticRegression": "modelo_logisticregression_train90.pkl",
+    "SVC_RBF": "modelo_svc_rbf_train90.pkl",
+    "KNN": "modelo_knn_train90.pkl",
+}
+PREFIJOS = {"RandomForest": "rf"}
+
+
+def prefijo(nombre):
+    return PREFIJOS.get(nombre, nombre.lower())
+
+
+# =========================
+# Gráficos (corren en los workers)
+# =========================
+def grafico_f1(destino, modelos, valores):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+    palette = list(plt.cm.tab20.colors)
+    colors = [palette[i % len(palette)] for i in range(len(valores))]
+    bars = plt.barh(modelos, valores, color=colors)
+
+    plt.title("Comparativo F1 — Test REAL 10%", fontsize=14)
+    plt.xlabel("F1", fontsize=12)
+    plt.ylabel("Modelo", fontsize=12)
+    plt.grid(axis="x", linestyle="--", alpha=0.35)
+
+    for bar, v in zip(bars, valores):
+        x = bar.get_width()
+        y = bar.get_y() + bar.get_height()/2
+        plt.text(x - 0.01, y, repr(float(v)), va="center", ha="right", fontsize=9)
+
+    plt.tight_layout()
+    plt.savefig(destino, dpi=DPI)
+    plt.close()
+
+
+def grafico_matriz_confusion(destino, nombre, cm):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(6,5))
+    sns.heatmap(np.asarray(cm), annot=True, fmt="d", cmap="Blues",
+                xticklabels=["No anemia", "Anemia"],
+                yticklabels=["No anemia", "Anemia"])
+    plt.title(f"Matriz de Confusión — {nombre} (Test 10%)", fontsize=14)
+    plt.xlabel("Predicción")
+    plt.ylabel("Real")
+    plt.tight_layout()
+    plt.savefig(destino, dpi=DPI)
+    plt.close()
+
+
+def grafico_roc(destino, curvas):
+    # curvas: [(nombre, fpr, tpr, auc)]; una sola = ROC del modelo, varias = comparativo
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(7,6))
+    for nombre, fpr, tpr, roc_auc in curvas:
+        etiqueta = f"AUC = {roc_auc}" if len(curvas) == 1 else f"{nombre} (AUC = {roc_auc:.4f})"
+        plt.plot(fpr, tpr, label=etiqueta, linewidth=2)
+    plt.plot([0,1], [0,1], linestyle="--", color="gray")
+    titulo = curvas[0][0] if len(curvas) == 1 else "Todos los modelos"
+    plt.title(f"Curva ROC — {titulo} (Test 10%)", fontsize=14)
+    plt.xlabel("Tasa de Falsos Positivos")
+    plt.ylabel("Tasa de Verdaderos Positivos")
+    plt.legend()
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(destino, dpi=DPI)
+    plt.close()
+
+
+def grafico_importancia(destino, nombre, features, importancias):
+    import matplotlib.pyplot as plt
+
+    orden = sorted(zip(importancias, features), reverse=True)
+    vals, labels = zip(*orden)
+
+    plt.figure(figsize=(10,6))
+    plt.barh(labels, vals, color=plt.cm.tab20.colors)
+    plt.title(f"Importancia de Características — {nombre} (90%)", fontsize=14)
+    plt.xlabel("Importancia")
+    plt.grid(axis="x", linestyle="--", alpha=0.35)
+    plt.gca().invert_yaxis()  # La más importante arriba
+    plt.tight_layout()
+    plt.savefig(destino, dpi=DPI)
+    plt.close()
+
+
+def grafico_boxplot_hemoglobina(destino, hemoglobina, clase):
+    import matplotlib.pyplot as plt
+
+    df = pd.DataFrame({"Hemoglobin": hemoglobina, "Result": clase})
+    plt.figure(figsize=(8,6))
+    df.boxplot(column="Hemoglobin", by="Result", grid=False,
+               patch_artist=True,
+               boxprops=dict(facecolor="lightblue"),
+               medianprops=dict(color="red", linewidth=2))
+    plt.title("Distribución de Hemoglobina por Clase — 90% Entrenamiento")
+    plt.suptitle("")  # Quitar título duplicado
+    plt.xlabel("Clase (0 = No anemia, 1 = Anemia)")
+    plt.ylabel("Nivel de Hemoglobina")
+    plt.tight_layout()
+    plt.savefig(destino, dpi=DPI)
+    plt.close()
+
+
+def _dibujar(fn, destino, args):
+    t = time.perf_counter()
+    fn(destino, *args)
+    return destino, time.perf_counter() - t
+
+
+# =========================
+# Qué dibujar de nuevo
+# =========================
+def huella_grafico(fn, args):
+    # Entradas = código de la función + sus argumentos + DPI
+    h = hashlib.sha256(inspect.getsource(fn).encode())
+    h.update(str(DPI).encode())
+
+    def agregar(v):
+        if isinstance(v, np.ndarray):
+            h.update(str((v.dtype.str, v.shape)).encode())
+            h.update(np.ascontiguousarray(v).tobytes())
+        elif isinstance(v, (list, tuple)):
+            h.update(b"[")
+            for x in v:
+                agregar(x)
+            h.update(b"]")
+        else:
+            h.update(repr(v).encode())
+    agregar(args)
+    return h.hexdigest()
+
+
+def leer_manifiesto():
+    if not os.path.exists(MANIFIESTO):
+        return {}
+    with open(MANIFIESTO, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    os.makedirs(PLOTS_DIR, exist_ok=True)
+    t0 = time.perf_counter()
+
+    # 1) Datos y modelos, una sola vez
+    test_df = leer_dataset(TEST_PATH)
+    train_df = leer_dataset(TRAIN_PATH)
+    X_test = test_df[COLUMNAS_X]
+    y_test = test_df["Result"].to_numpy()
+
+    modelos = {}
+    for nombre, filename in model_files.items():
+        model_path = os.path.join(MODELS_DIR, filename)
+        if not os.path.exists(model_path):
+            print(f"⚠️ No encontré: {model_path}")
+            continue
+        modelos[nombre] = joblib.load(model_path)
+    print(f"✅ {len(modelos)} modelos y {len(test_df)} filas de test cargados "
+          f"en {time.perf_counter() - t0:.2f}s")
+
+    # 2) Una pasada de predict_proba por modelo; todo lo demás sale de ahí
+    print("\n=== 🔍 Evaluación FINAL en el 10% HOLD-OUT ===\n")
+    resultados, detalle, probs, preds = [], {}, {}, {}
+    for nombre, modelo in modelos.items():
+        proba = modelo.predict_proba(X_test)
+        y_pred = modelo.classes_[np.argmax(proba, axis=1)]
+        y_prob = proba[:, list(modelo.classes_).index(1)]
+        probs[nombre] = y_prob
+        preds[nombre] = y_pred
+
+        fpr, tpr, _ = roc_curve(y_test, y_prob)
+        cm = confusion_matrix(y_test, y_pred, labels=[0, 1])
+        resultados.append({
+            "Modelo": nombre,
+            "Accuracy": accuracy_score(y_test, y_pred),
+            "Precision": precision_score(y_test, y_pred, zero_division=0),
+            "Recall": recall_score(y_test, y_pred, zero_division=0),
+            "F1": f1_score(y_test, y_pred, zero_division=0),
+        })
+        detalle[nombre] = {"auc": auc(fpr, tpr), "matriz_confusion": cm.tolist(),
+                           "fpr": fpr, "tpr": tpr}
+
+    resultados_df = pd.DataFrame(resultados)
+    resultados_df["AUC"] = [detalle[n]["auc"] for n in resultados_df["Modelo"]]
+
+    # Mostrar TABLA comparativa SIN redondear
+    print("📊 === TABLA COMPARATIVA TEST 10% (SIN REDONDEAR) ===")
+    print(resultados_df.to_string(index=False))
+
+    out_csv = os.path.join(RESULTS_DIR, "resultados_modelos_test10.csv")
+    resultados_df.drop(columns=["AUC"]).to_csv(out_csv, index=False)  # mismas columnas de siempre
+    with open(os.path.join(RESULTS_DIR, "evaluacion_test10.json"), "w", encoding="utf-8") as f:
+        json.dump({n: {"auc": d["auc"], "matriz_confusion": d["matriz_confusion"],
+                       **resultados_df.set_index("Modelo").loc[n].drop("AUC").to_dict()}
+                   for n, d in detalle.items()}, f, indent=2)
+    # Predicciones guardadas: el bootstrap y otros análisis no vuelven a predecir
+    np.savez(os.path.join(RESULTS_DIR, "predicciones_test10.npz"),
+             y=y_test, modelos=np.array(list(probs)),
+             **{f"prob_{n}": p for n, p in probs.items()}, **{f"pred_{n}": p for n, p in preds.items()})
+    print(f"\n📄 Resultados guardados en: {out_csv} (+ evaluacion_test10.json, predicciones_test10.npz)")
+
+    # 3) Gráficos: (función, destino, argumentos)
+    orden = resultados_df.sort_values(by="F1", ascending=True)
+    trabajos = [(grafico_f1, "test10_f1.png", (orden["Modelo"].tolist(), orden["F1"].tolist()))]
+    for nombre, d in detalle.items():
+        trabajos.append((grafico_matriz_confusion, f"{prefijo(nombre)}_matriz_confusion_test10.png",
+                         (nombre, d["matriz_confusion"])))
+        trabajos.append((grafico_roc, f"{prefijo(nombre)}_curva_roc_test10.png",
+                         ([(nombre, d["fpr"], d["tpr"], d["auc"])],)))
+    trabajos.append((grafico_roc, "comparativo_roc_test10.png",
+                     ([(n, d["fpr"], d["tpr"], d["auc"]) for n, d in detalle.items()],)))
+    for nombre, modelo in modelos.items():
+        if hasattr(modelo, "feature_importances_"):
+            trabajos.append((grafico_importancia, f"{prefijo(nombre)}_importancia_variables.png",
+                             (nombre, COLUMNAS_X, modelo.feature_importances_)))
+    trabajos.append((grafico_boxplot_hemoglobina, "rf_boxplot_hemoglobina.png",
+                     (train_df["Hemoglobin"].to_numpy(), train_df["Result"].to_numpy())))
+
+    manifiesto = leer_manifiesto()
+    pendientes = []
+    for fn, archivo, args in trabajos:
+        destino = os.path.join(PLOTS_DIR, archivo)
+        huella = huella_grafico(fn, args)
+        if manifiesto.get(destino) == huella and os.path.exists(destino):
+            continue
+        pendientes.append((fn, destino, args, huella))
+    print(f"\n🎨 {len(pendientes)} gráficos por dibujar, {len(trabajos) - len(pendientes)} sin cambios")
+
+    if pendientes:
+        t = time.perf_counter()
+        with ProcessPoolExecutor(min(N_PROCESOS, len(pendientes))) as ex:
+            futuros = [(ex.submit(_dibujar, fn, destino, args), destino, huella)
+                       for fn, destino, args, huella in pendientes]
+            for futuro, destino, huella in futuros:
+                _, segundos = futuro.result()
+                manifiesto[destino] = huella
+                print(f"📊 Gráfico guardado: {destino} ({segundos:.2f}s)")
+        with open(MANIFIESTO, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2)
+        print(f"⏱️ Gráficos en {time.perf_counter() - t:.2f}s")
+
+    print(f"\n✅ Evaluación COMPLETA del 10% terminada en {time.perf_counter() - t0:.2f}s.\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# === EXPORTAR MODELOS A ARREGLOS NUMPY (para servir sin sklearn) ===
+# Convierte cada modelo entrenado de Modelos/ a un artefacto .npmodel (una
+# carpeta con meta.json + un .npy por arreglo) que el backend carga solo con
+# NumPy: RandomForest y DecisionTree (árboles aplanados: característica,
+# umbral, hijos, valor de hoja), HistGradientBoosting (árboles de regresión
+# + predicción base) y la regresión logística con su StandardScaler.
+# Cada artefacto se valida en el 10% hold-out: las probabilidades tienen que
+# ser IDÉNTICAS (bit a bit) a las de predict_proba.
+#
+#   python exportar_modelos.py                  # todos los soportados
+#   python exportar_modelos.py randomforest     # solo algunos
+import json
+import os
+import shutil
+import sys
+import warnings
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from carga_datos import leer_dataset
+
+# El cargador vive en el backend: así se valida exactamente lo que se sirve
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from modelos_numpy import FORMATO, VERSION_FORMATO, cargar_modelo_numpy  # noqa: E402
+
+# RUTAS
+DATA_DIR = "data"
+MODELS_DIR = "Modelos"
+TEST_PATH = os.path.join(DATA_DIR, "anemia_test_10_holdout.csv")
+
+HOJA = -1  # sklearn marca las hojas con hijo izquierdo = -1
+
+
+def aplanar_bosque(bosque, tipo="bosque"):
+    """Concatena los nodos de todos los árboles con índices globales."""
+    arboles = bosque.estimators_ if tipo == "bosque" else [bosque]
+    raices, caracteristica, umbral, hijos, valor, faltante_der = [], [], [], [], [], []
+    desplazamiento = 0
+    for arbol in arboles:
+        t = arbol.tree_
+        n = t.node_count
+        es_hoja = t.children_left == HOJA
+        propios = np.arange(n) + desplazamiento
+
+        raices.append(desplazamiento)
+        caracteristica.append(np.where(es_hoja, 0, t.feature))
+        umbral.append(np.where(es_hoja, 0.0, t.threshold))
+        # Las hojas apuntan a sí mismas: recorrer de más no las mueve.
+        # Hijos intercalados por nodo: [izq, der]
+        izquierdo = np.where(es_hoja, propios, t.children_left + desplazamiento)
+        derecho = np.where(es_hoja, propios, t.children_right + desplazamiento)
+        hijos.append(np.stack([izquierdo, derecho], axis=1).ravel())
+
+        # Igual que DecisionTreeClassifier.predict_proba: normalizar por fila
+        v = t.value[:, 0, :].astype(np.float64)
+        normalizador = v.sum(axis=1)[:, np.newaxis]
+        normalizador[normalizador == 0.0] = 1.0
+        valor.append(v / normalizador)
+        # Lado al que predict manda un NaN en cada nodo
+        faltante_der.append(~t.missing_go_to_left.astype(bool))
+
+        desplazamiento += n
+
+    arreglos = {
+        "raices": np.asarray(raices, dtype=np.int64),
+        "caracteristica": np.concatenate(caracteristica).astype(np.int64),
+        "umbral": np.concatenate(umbral).astype(np.float64),
+        "hijos": np.concatenate(hijos).astype(np.int64),
+        "valor": np.ascontiguousarray(np.concatenate(valor)),
+        "faltante_der": np.concatenate(faltante_der),
+    }
+    meta = {
+        "tipo": tipo,
+        "clases": [int(c) for c in bosque.classes_],
+        "n_features": int(bosque.n_features_in_),
+        "profundidad": int(max(a.tree_.max_depth for a in arboles)),
+        "n_arboles": len(arboles),
+    }
+    return meta, arreglos
+
+
+def aplanar_gradiente(hgb):
+    """HistGradientBoosting binario: los nodos de sus predictores (un árbol
+    de regresión por iteración) con el mismo esquema del bosque."""
+    if len(hgb.classes_) != 2 or hgb.n_trees_per_iteration_ != 1:
+        raise ValueError("Solo se exporta HistGradientBoosting binario")
+    if hgb.is_categorical_ is not None and np.any(hgb.is_categorical_):
+        raise ValueError("HistGradientBoosting con variables categóricas no soportado")
+
+    raices, caracteristica, umbral, hijos, valor, faltante_der = [], [], [], [], [], []
+    desplazamiento = 0
+    profundidad = 0
+    for (predictor,) in hgb._predictors:
+        nodos = predictor.nodes
+        n = len(nodos)
+        es_hoja = nodos["is_leaf"].astype(bool)
+        propios = np.arange(n) + desplazamiento
+
+        raices.append(desplazamiento)
+        caracteristica.append(np.where(es_hoja, 0, nodos["feature_idx"]))
+        umbral.append(np.where(es_hoja, 0.0, nodos["num_threshold"]))
+        izquierdo = np.where(es_hoja, propios, nodos["left"].astype(np.int64) + desplazamiento)
+        derecho = np.where(es_hoja, propios, nodos["right"].astype(np.int64) + desplazamiento)
+        hijos.append(np.stack([izquierdo, derecho], axis=1).ravel())
+        valor.append(np.where(es_hoja, nodos["value"], 0.0))
+        faltante_der.append(~nodos["missing_go_to_left"].astype(bool))
+        profundidad = max(profundidad, int(nodos["depth"].max()))
+        desplazamiento += n
+
+    arreglos = {
+        "raices": np.asarray(raices, dtype=np.int64),
+        "caracteristica": np.concatenate(caracteristica).astype(np.int64),
+        "umbral": np.concatenate(umbral).astype(np.float64),
+        "hijos": np.concatenate(hijos).astype(np.int64),
+        "valor": np.concatenate(valor).astype(np.float64),
+        "faltante_der": np.concatenate(faltante_der),
+    }
+    meta = {
+        "tipo": "gradiente",
+        "clases": [int(c) for c in hgb.classes_],
+        "n_features": int(hgb.n_features_in_),
+        "profundidad": profundidad,
+        "n_arboles": len(hgb._predictors),
+        # repr de float: JSON la devuelve exacta
+        "base": float(np.asarray(hgb._baseline_prediction).ravel()[0]),
+    }
+    return meta, arreglos
+
+
+def aplanar_lineal(modelo):
+    """[StandardScaler +] LogisticRegression binaria."""
+    escalador, lineal = (modelo[0], modelo[-1]) if isinstance(modelo, Pipeline) else (None, modelo)
+    if isinstance(modelo, Pipeline) and (len(modelo) != 2 or not isinstance(escalador, StandardScaler)):
+        raise ValueError("Solo se exporta Pipeline(StandardScaler, LogisticRegression)")
+    if len(lineal.classes_) != 2:
+        raise ValueError("Solo se exporta LogisticRegression binaria")
+    n = int(lineal.n_features_in_)
+    # Sin centrar/escalar: restar 0 y dividir por 1 no cambia nada
+    media = escalador.mean_ if escalador is not None and escalador.with_mean else np.zeros(n)
+    escala = escalador.scale_ if escalador is not None and escalador.with_std else np.ones(n)
+    arreglos = {
+        "media": np.asarray(media, dtype=np.float64),
+        "escala": np.asarray(escala, dtype=np.float64),
+        "coef": np.ascontiguousarray(lineal.coef_, dtype=np.float64),
+        "intercepto": np.asarray(lineal.intercept_, dtype=np.float64),
+    }
+    meta = {
+        "tipo": "lineal",
+        "clases": [int(c) for c in lineal.classes_],
+        "n_features": n,
+        "escalado": escalador is not None,
+    }
+    return meta, arreglos
+
+
+def aplanar(modelo):
+    """Elige el exportador según el tipo; None si no hay versión NumPy (SVC, KNN)."""
+    final = modelo[-1] if isinstance(modelo, Pipeline) else modelo
+    if isinstance(modelo, RandomForestClassifier):
+        return aplanar_bosque(modelo)
+    if isinstance(modelo, DecisionTreeClassifier):
+        return aplanar_bosque(modelo, tipo="arbol")
+    if isinstance(modelo, HistGradientBoostingClassifier):
+        return aplanar_gradiente(modelo)
+    if isinstance(final, LogisticRegression):
+        return aplanar_lineal(modelo)
+    return None
+
+
+def guardar_artefacto(destino, meta, arreglos, origen):
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+    for nombre, arr in arreglos.items():
+        np.save(os.path.join(destino, f"{nombre}.npy"), arr)
+    meta = {
+        "formato": FORMATO,
+        "version": VERSION_FORMATO,
+        **meta,
+        "origen": os.path.basename(origen),
+        "sklearn": sklearn.__version__,
+        "arreglos": list(arreglos),
+    }
+    with open(os.path.join(destino, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def exportar(origen, X_test):
+    destino = origen[:-len(".pkl")] + ".npmodel"
+    modelo = joblib.load(origen)
+    if hasattr(modelo, "n_jobs"):
+        modelo.n_jobs = 1  # suma de árboles en orden fijo (determinista)
+    plano = aplanar(modelo)
+    if plano is None:
+        print(f"⏭️ {origen}: {type(modelo).__name__} sin versión NumPy, se sirve el .pkl")
+        return
+    meta, arreglos = plano
+    guardar_artefacto(destino, meta, arreglos, origen)
+    detalle = f"{meta['n_arboles']} árboles, profundidad {meta['profundidad']}" if "n_arboles" in meta else meta["tipo"]
+    print(f"💾 Exportado {origen} -> {destino} ({detalle})")
+
+    # Validación bit a bit en el 10% hold-out, con la misma matriz que arma
+    # la API: float64 en orden C (un DataFrame da orden Fortran, que cambia
+    # el orden de las sumas del producto con los coeficientes)
+    esperado = modelo.predict_proba(X_test)
+    obtenido = cargar_modelo_numpy(destino).predict_proba(X_test)
+    if not np.array_equal(esperado, obtenido):
+        dif = float(np.abs(esperado - obtenido).max())
+        shutil.rmtree(destino)  # que el backend no sirva un artefacto inválido
+        raise SystemExit(f"❌ {destino}: las probabilidades NO coinciden (máx. diferencia {dif!r})")
+    print(f"✅ Probabilidades idénticas a predict_proba en {len(X_test)} filas del hold-out")
+
+    # Los árboles aceptan NaN: el hold-out con un faltante por fila (columna
+    # rotando) tiene que seguir el mismo lado en cada nodo que sklearn
+    if "faltante_der" in arreglos:
+        X_nan = X_test.copy()
+        X_nan[np.arange(len(X_nan)), np.arange(len(X_nan)) % X_nan.shape[1]] = np.nan
+        if not np.array_equal(modelo.predict_proba(X_nan), cargar_modelo_numpy(destino).predict_proba(X_nan)):
+            shutil.rmtree(destino)
+            raise SystemExit(f"❌ {destino}: con NaN las probabilidades NO coinciden")
+        print("✅ También con NaN")
+
+
+if __name__ == "__main__":
+    test_df = leer_dataset(TEST_PATH)
+    X_test = np.ascontiguousarray(test_df.drop(columns=["Result"]).to_numpy(dtype=np.float64))
+    # Se ajustaron con DataFrame; la API también predice sobre arreglos
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    nombres = sys.argv[1:]
+    origenes = sorted(
+        os.path.join(MODELS_DIR, f) for f in os.listdir(MODELS_DIR)
+        if f.startswith("modelo_") and f.endswith("_train90.pkl")
+        and (not nombres or f[len("modelo_"):-len("_train90.pkl")] in nombres)
+    )
+    for origen in origenes:
+        exportar(origen, X_test)
@@ -1,11 +1,12 @@
 # === GRAFICOS CLINICOS RANDOM FOREST (90%) ===
 import os
 import joblib
-import pandas as pd
 import matplotlib.pyplot as plt
 
 from sklearn.ensemble import RandomForestClassifier
 
+from carga_datos import leer_dataset
+
 # Directorios
 DATA_DIR = "data"
 MODELS_DIR = "Modelos"
@@ -14,10 +15,10 @@ PLOTS_DIR = "Graficos"
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
 # Cargar dataset 90%
-df_train = pd.read_csv(os.path.join(DATA_DIR, "anemia_train_90.csv"))
+df_train = leer_dataset(os.path.join(DATA_DIR, "anemia_train_90.csv"))
 
 X_train = df_train.drop(columns=["Result"])
-y_train = df_train["Result"].astype(int)
+y_train = df_train["Result"]
 
 # Cargar modelo Random Forest entrenado con el 90%
 model_path = os.path.join(MODELS_DIR, "modelo_randomforest_train90.pkl")
@@ -1,12 +1,13 @@
 # === GRAFICOS DE PRUEBA DE CAMPO — RANDOM FOREST (10% HOLD-OUT) ===
 import os
 import joblib
-import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.metrics import confusion_matrix, roc_curve, auc
 
 import seaborn as sns
 
+from carga_datos import leer_dataset
+
 # Directorios
 DATA_DIR = "data"
 MODELS_DIR = "Modelos"
@@ -22,9 +23,9 @@ modelo = joblib.load(model_path)
 # ============================
 # Cargar dataset TEST 10%
 # ============================
-df_test = pd.read_csv(os.path.join(DATA_DIR, "anemia_test_10_holdout.csv"))
+df_test = leer_dataset(os.path.join(DATA_DIR, "anemia_test_10_holdout.csv"))
 X_test = df_test.drop(columns=["Result"])
-y_test = df_test["Result"].astype(int)
+y_test = df_test["Result"]
 
 # ============================
 # Predicciones en el 10%